@@ -1,195 +1,109 @@
 import numpy as np
 import random
 from const import *
-from square import Square
 from piece import *
 from move import Move
-from board import Board
+from position import Position, squares_of
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from eval_cache import EvaluationCache
+from collections import OrderedDict
+from book import OpeningBook, DEFAULT_BOOK_PATH
+from tablebase import EndgameTables, DEFAULT_TABLE_DIR
 import traceback
 import os
+import time
+import threading
+import importlib.util
+import json
+from evaluation import *
+from numpy_model import NumpyModel
+
+# TensorFlow is imported the first time a neural network evaluator needs it, the import takes
+# seconds and a lot of memory that Human vs Human and the basic AI never use
+TF_AVAILABLE = importlib.util.find_spec("tensorflow") is not None
+tf = None
+layers = models = None
+_tf_lock = threading.Lock()
+
+DEFAULT_MODEL_PATH = MODEL_PATH  # const.py, where ai_train.ipynb saves the model
+
+def numpy_model_path(model_path):
+    # Where numpy_model.py exports a model to, used instead of the Keras file when it exists
+    return os.path.splitext(model_path)[0] + ".npz"
+
+def move_vocabulary_path(model_path):
+    # Saved by ai_train.ipynb next to a move-classification model (MODEL_MOVES_PATH for MODEL_PATH),
+    # entry i names the move of output i
+    return os.path.splitext(model_path)[0] + "_moves.json"
+
+def nn_available(model_path=DEFAULT_MODEL_PATH):
+    return TF_AVAILABLE or os.path.exists(numpy_model_path(model_path))
+
+def load_tensorflow():
+    # Import TensorFlow if it isn't yet, False when it can't be imported
+    global tf, layers, models, TF_AVAILABLE
+    with _tf_lock:
+        if tf is None and TF_AVAILABLE:
+            try:
+                import tensorflow
+                from tensorflow.keras import layers as keras_layers, models as keras_models
+                tf, layers, models = tensorflow, keras_layers, keras_models
+            except ImportError:
+                TF_AVAILABLE = False
+        if tf is None:
+            print("TensorFlow not available, falling back to simple evaluation")
+        return tf is not None
 
-# Import TensorFlow - make sure it's installed
-try:
-    import tensorflow as tf
-    from tensorflow.keras.models import load_model
-    from tensorflow.keras import layers, models
-    TF_AVAILABLE = True
-except ImportError:
-    print("TensorFlow not available, falling back to simple evaluation")
-    TF_AVAILABLE = False
-
-piece_values = {
-    "pawn": 1,
-    "knight": 3,
-    "bishop": 3,
-    "rook": 5,
-    "queen": 9,
-    "king": 100  # High value, but not so high it distorts calculations
-}
-
-# Piece-Square tables for positional evaluation
-# These tables provide bonus/penalty values for piece positions
-pawn_table = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [50, 50, 50, 50, 50, 50, 50, 50],
-    [10, 10, 20, 30, 30, 20, 10, 10],
-    [5, 5, 10, 25, 25, 10, 5, 5],
-    [0, 0, 0, 20, 20, 0, 0, 0],
-    [5, -5, -10, 0, 0, -10, -5, 5],
-    [5, 10, 10, -20, -20, 10, 10, 5],
-    [0, 0, 0, 0, 0, 0, 0, 0]
-]
-
-knight_table = [
-    [-50, -40, -30, -30, -30, -30, -40, -50],
-    [-40, -20, 0, 0, 0, 0, -20, -40],
-    [-30, 0, 10, 15, 15, 10, 0, -30],
-    [-30, 5, 15, 20, 20, 15, 5, -30],
-    [-30, 0, 15, 20, 20, 15, 0, -30],
-    [-30, 5, 10, 15, 15, 10, 5, -30],
-    [-40, -20, 0, 5, 5, 0, -20, -40],
-    [-50, -40, -30, -30, -30, -30, -40, -50]
-]
-
-bishop_table = [
-    [-20, -10, -10, -10, -10, -10, -10, -20],
-    [-10, 0, 0, 0, 0, 0, 0, -10],
-    [-10, 0, 10, 10, 10, 10, 0, -10],
-    [-10, 5, 5, 10, 10, 5, 5, -10],
-    [-10, 0, 5, 10, 10, 5, 0, -10],
-    [-10, 10, 10, 10, 10, 10, 10, -10],
-    [-10, 5, 0, 0, 0, 0, 5, -10],
-    [-20, -10, -10, -10, -10, -10, -10, -20]
-]
-
-rook_table = [
-    [0, 0, 0, 0, 0, 0, 0, 0],
-    [5, 10, 10, 10, 10, 10, 10, 5],
-    [-5, 0, 0, 0, 0, 0, 0, -5],
-    [-5, 0, 0, 0, 0, 0, 0, -5],
-    [-5, 0, 0, 0, 0, 0, 0, -5],
-    [-5, 0, 0, 0, 0, 0, 0, -5],
-    [-5, 0, 0, 0, 0, 0, 0, -5],
-    [0, 0, 0, 5, 5, 0, 0, 0]
-]
-
-queen_table = [
-    [-20, -10, -10, -5, -5, -10, -10, -20],
-    [-10, 0, 0, 0, 0, 0, 0, -10],
-    [-10, 0, 5, 5, 5, 5, 0, -10],
-    [-5, 0, 5, 5, 5, 5, 0, -5],
-    [0, 0, 5, 5, 5, 5, 0, -5],
-    [-10, 5, 5, 5, 5, 5, 0, -10],
-    [-10, 0, 5, 0, 0, 0, 0, -10],
-    [-20, -10, -10, -5, -5, -10, -10, -20]
-]
-
-king_middle_table = [
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-30, -40, -40, -50, -50, -40, -40, -30],
-    [-20, -30, -30, -40, -40, -30, -30, -20],
-    [-10, -20, -20, -20, -20, -20, -20, -10],
-    [20, 20, 0, 0, 0, 0, 20, 20],
-    [20, 30, 10, 0, 0, 10, 30, 20]
-]
-
-king_end_table = [
-    [-50, -40, -30, -20, -20, -30, -40, -50],
-    [-30, -20, -10, 0, 0, -10, -20, -30],
-    [-30, -10, 20, 30, 30, 20, -10, -30],
-    [-30, -10, 30, 40, 40, 30, -10, -30],
-    [-30, -10, 30, 40, 40, 30, -10, -30],
-    [-30, -10, 20, 30, 30, 20, -10, -30],
-    [-30, -30, 0, 0, 0, 0, -30, -30],
-    [-50, -30, -30, -30, -30, -30, -30, -50]
-]
-
-piece_position_tables = {
-    "pawn": pawn_table,
-    "knight": knight_table,
-    "bishop": bishop_table,
-    "rook": rook_table,
-    "queen": queen_table,
-    "king": king_middle_table  # Default to middle game
-}
 
 # Updated class to encode chess board for neural network
 class ChessEncoder:
+    # 8x8x12 float32 planes, 12 channels for 6 piece types × 2 colors (piece type + 6 for black).
+    # Same layout as board_to_matrix in ai_train.ipynb: python-chess squares, so the first row
+    # is rank 1 (board row 7), the model is trained on that orientation.
+
     @staticmethod
-    def board_to_matrix(board_squares):
-        # Create an 8x8x12 matrix representation for the neural network
-        # 12 channels for 6 piece types × 2 colors
-        matrix = np.zeros((8, 8, 12))
+    def board_to_matrix(board_squares, out=None):
+        # New (1, 8, 8, 12) batch of one, or written in place into out, an (8, 8, 12) slot
+        # of a preallocated batch, so encoding in the search allocates nothing
+        if out is None:
+            out = np.zeros((1, 8, 8, 12), dtype=np.float32)
+            matrix = out[0]
+        else:
+            matrix = out
+            matrix.fill(0)
         
         for row in range(ROWS):
+            board_row = board_squares[row]
             for col in range(COLS):
-                square = board_squares[row][col]
-                if square.has_piece():
-                    piece = square.piece
-                    # Map piece type to index
-                    piece_type_map = {
-                        "pawn": 0,
-                        "knight": 1,
-                        "bishop": 2,
-                        "rook": 3,
-                        "queen": 4,
-                        "king": 5
-                    }
+                piece = board_row[col].piece
+                if piece is not None:
+                    matrix[7 - row, col, piece_index(piece)] = 1
                     
-                    piece_type = piece_type_map.get(piece.name, 0)
-                    # Add color offset (0 for white, 6 for black)
-                    piece_color = 0 if piece.color == "white" else 6
-                    matrix[row, col, piece_type + piece_color] = 1
-                    
-        return matrix[np.newaxis, ...]  # Add batch dimension
+        return out
+
+    @staticmethod
+    def apply_move(matrix, undo):
+        # Update planes encoded before Board.make_move to after it, from the move's Undo record
+        piece = undo.piece
+        if piece is None:
+            return  # null move, nothing moved
+        initial, final = undo.move.initial, undo.move.final
+        if undo.captured is not None:
+            matrix[7 - undo.captured_row, undo.captured_col, piece_index(undo.captured)] = 0
+        matrix[7 - initial.row, initial.col, piece_index(piece)] = 0
+        matrix[7 - final.row, final.col, piece_index(undo.promoted or piece)] = 1
+        if undo.rook is not None:
+            rook = piece_index(undo.rook)
+            matrix[7 - final.row, undo.rook_from, rook] = 0
+            matrix[7 - final.row, undo.rook_to, rook] = 1
 
 # Improved evaluator with position tables for better positional understanding
 class ImprovedEvaluator:
     def __init__(self):
         pass
-        
-    def evaluate(self, board_squares):
-        # Material and positional evaluation
-        score = 0
-        material_score = 0
-        position_score = 0
-        
-        # Check if endgame (simplified check - fewer than 10 pieces)
-        piece_count = 0
-        for row in range(ROWS):
-            for col in range(COLS):
-                if board_squares[row][col].has_piece():
-                    piece_count += 1
-        
-        is_endgame = piece_count <= 10
-        
-        # Material and position score
-        for row in range(ROWS):
-            for col in range(COLS):
-                square = board_squares[row][col]
-                if square.has_piece():
-                    piece = square.piece
-                    # Add proper piece value
-                    value = piece_values.get(piece.name, 0)
-                    sign = 1 if piece.color == "white" else -1
-                    material_score += value * sign
-                    
-                    # Position value from tables
-                    position_table = piece_position_tables.get(piece.name)
-                    
-                    # Special case for king in endgame
-                    if piece.name == "king" and is_endgame:
-                        position_table = king_end_table
-                    
-                    if position_table:
-                        # For black pieces, we need to flip the table
-                        if piece.color == "white":
-                            position_score += position_table[row][col] * 0.01 * sign
-                        else:
-                            position_score += position_table[7-row][col] * 0.01 * sign
-                    
+    
+    @staticmethod
+    def center_control(board_squares):
         # Control of center squares
         center_control = 0
         center_squares = [(3, 3), (3, 4), (4, 3), (4, 4)]
@@ -197,17 +111,46 @@ class ImprovedEvaluator:
             square = board_squares[row][col]
             if square.has_piece():
                 center_control += 0.1 if square.piece.color == "white" else -0.1
-                
-        # Combine all evaluation factors
-        score = material_score + position_score + center_control
+        return center_control
+        
+    def evaluate(self, board_squares):
+        # Material and positional evaluation, blended between the middlegame and endgame
+        # tables by how much material is left instead of switching at a fixed piece count
+        return tapered(*score_squares(board_squares)) + self.center_control(board_squares)
+
+    def evaluate_board(self, board):
+        # Same as evaluate, but from the totals Board keeps up to date in make_move / unmake_move
+        return tapered(board.eval_mg, board.eval_eg, board.phase) + self.center_control(board.squares)
+
+    def evaluate_position(self, position):
+        # Same evaluation as evaluate, straight from the bitboards of a Position
+        middlegame = endgame = 0.0
+        phase = 0
+        for index, bb in enumerate(position.pieces):
+            if not bb:
+                continue
+            middlegame_scores = MIDDLEGAME_SCORES[index]
+            endgame_scores = ENDGAME_SCORES[index]
+            for sq in squares_of(bb):
+                middlegame += middlegame_scores[sq]
+                endgame += endgame_scores[sq]
+            phase += PHASE[index] * bb.bit_count()
         
-        return score
+        # Control of center squares (d5, e5, d4, e4)
+        center = 1 << 27 | 1 << 28 | 1 << 35 | 1 << 36
+        center_control = 0.1 * ((position.occupied[0] & center).bit_count() - (position.occupied[1] & center).bit_count())
+        
+        return tapered(middlegame, endgame, phase) + center_control
+
+    def evaluate_positions(self, positions):
+        # evaluate_position for a whole list of Positions in one vectorized pass, as a float32 array
+        return evaluate_bitboards(positions_to_bitboards(positions))
 
 # This class creates a custom model if the saved model can't be loaded
 class ModelBuilder:
     @staticmethod
     def create_chess_model():
-        if not TF_AVAILABLE:
+        if not load_tensorflow():
             return None
             
         try:
@@ -232,207 +175,682 @@ class ModelBuilder:
 
 # Neural Network evaluator using TensorFlow model with better error handling
 class NeuralNetworkEvaluator:
-    def __init__(self, model_path="./ai_models/TF_1EPOCHS.h5"):
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, background=False):
         self.model = None
+        self.model_path = model_path
+        # A move-classification (policy) model orders moves in the search instead of scoring leaves,
+        # move_index maps its outputs to moves (uci names as in ai_train.ipynb)
+        self.policy = False
+        self.move_index = None
+        self.fallback = ImprovedEvaluator()  # material + position score when the model can't help
+        self.input = np.zeros((1, 8, 8, 12), dtype=np.float32)  # reused by every single evaluation
+        self.ready = threading.Event()  # set once loading is over, whether or not there is a model
+        
+        # Until the model is loaded every evaluation falls back to the improved evaluator
+        if background:
+            threading.Thread(target=self.load, name="nn-warm-up", daemon=True).start()
+        else:
+            self.load()
+
+    @property
+    def status(self):
+        if not self.ready.is_set():
+            return "loading"
+        return "ready" if self.model is not None else "unavailable"
+
+    def load(self):
+        model = None
+        # An exported NumPy copy of the model runs without TensorFlow and with far less overhead
+        numpy_path = numpy_model_path(self.model_path)
+        if os.path.exists(numpy_path):
+            try:
+                model = NumpyModel.load(numpy_path)
+                print(f"Loaded NumPy NN model from {numpy_path}")
+            except Exception as e:
+                print(f"Error loading NumPy model: {e}")
         
         # Try to load the model with improved error handling
-        if TF_AVAILABLE:
+        if model is None and load_tensorflow():
             try:
                 # allow legacy fields in the .keras archive
-                self.model = tf.keras.models.load_model(
-                    model_path,
+                model = tf.keras.models.load_model(
+                    self.model_path,
                     compile=False,      # not training here
                     safe_mode=False     # ← key line
                 )
-                print(f"Loaded NN model from {model_path}")
+                print(f"Loaded NN model from {self.model_path}")
             except Exception as e:
                 print(f"Error loading saved model: {e}")
                 print("Attempting to create a new model...")
-                self.model = ModelBuilder.create_chess_model()
+                model = ModelBuilder.create_chess_model()
+            
+        if model is not None:
+            # Dummy inference so the first real move doesn't pay for building the predict function,
+            # the output size also tells a value model (one score) from a policy model
+            try:
+                outputs = np.asarray(model.predict_on_batch(np.zeros((1, 8, 8, 12), dtype=np.float32))).shape[-1]
+            except Exception as e:
+                print(f"Model warm-up failed: {e}")
+                outputs = 1
+            if outputs > 1:
+                model = self.load_move_vocabulary(model, outputs)
+        
+        self.model = model
+        self.ready.set()
+
+    def load_move_vocabulary(self, model, outputs):
+        # The policy model's move names, without them its outputs can't be used at all
+        path = move_vocabulary_path(self.model_path)
+        try:
+            with open(path) as f:
+                moves = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Policy model without a move vocabulary ({e}), using the improved evaluation")
+            return None
+        if len(moves) != outputs:
+            print(f"Move vocabulary {path} has {len(moves)} moves, the model {outputs} outputs, using the improved evaluation")
+            return None
+        self.move_index = {move: index for index, move in enumerate(moves)}
+        self.policy = True
+        print(f"Policy model, {outputs} moves in the vocabulary")
+        return model
     
+    def evaluate_board(self, board):
+        # A policy model has nothing to say about leaves, they get the cheap static evaluation
+        if self.model is None or self.policy:
+            return self.fallback.evaluate_board(board)
+        ChessEncoder.board_to_matrix(board.squares, self.input[0])
+        return self.evaluate_batch(self.input, [self.fallback.evaluate_board(board)])[0]
+
     def evaluate(self, board_squares):
         # If model is still not available, fall back to improved evaluator
-        if self.model is None:
-            improved_eval = ImprovedEvaluator()
-            return improved_eval.evaluate(board_squares)
+        if self.model is None or self.policy:
+            return self.fallback.evaluate(board_squares)
+        
+        # Convert board to matrix representation for the neural network
+        ChessEncoder.board_to_matrix(board_squares, self.input[0])
+        return self.evaluate_batch(self.input, [self.fallback.evaluate(board_squares)])[0]
+
+    def evaluate_batch(self, input_matrices, basic_evals):
+        # Scores for a whole batch of encoded positions (N, 8, 8, 12) with one forward pass,
+        # basic_evals are the ImprovedEvaluator scores of the same positions
+        if self.model is None or self.policy:
+            return list(basic_evals)
         
         try:
-            # Convert board to matrix representation for the neural network
-            input_matrix = ChessEncoder.board_to_matrix(board_squares)
+            # Get model predictions, predict_on_batch skips predict's per-call setup
+            prediction = np.asarray(self.model.predict_on_batch(input_matrices))
             
-            # Get model predictions
-            prediction = self.model.predict(input_matrix, verbose=0)
-            
-            # For a model that outputs a single evaluation score
-            if prediction.shape[-1] == 1:
-                # Scale from [-1, 1] to a reasonable chess evaluation range
-                nn_eval = float(prediction[0][0]) * 10  # Scale to roughly -10 to +10
-            else: 
-                # For models that output move probabilities or other formats
-                # We'll still need a fallback evaluation
-                improved_eval = ImprovedEvaluator()
-                basic_eval = improved_eval.evaluate(board_squares)
-                
-                # Use confidence of best move as a modifier to the basic evaluation
-                confidence = np.max(prediction)
-                side_advantage = 1 if basic_eval > 0 else -1
-                nn_eval = basic_eval + (confidence * side_advantage)
-            
-            return nn_eval
+            # Scale from [-1, 1] to a reasonable chess evaluation range
+            return [float(value) * 10 for value in prediction[:, 0]]  # Scale to roughly -10 to +10
             
         except Exception as e:
             print(f"Error in neural network evaluation: {e}")
             print(traceback.format_exc())
             # Fall back to improved evaluator
-            improved_eval = ImprovedEvaluator()
-            return improved_eval.evaluate(board_squares)
+            return list(basic_evals)
+
+    def move_priors(self, board, moves):
+        # Policy model probability of each move as (Position move ints, probabilities) arrays aligned
+        # with moves, None without a policy model
+        if self.model is None or not self.policy:
+            return None
+        ChessEncoder.board_to_matrix(board.squares, self.input[0])
+        try:
+            probabilities = np.asarray(self.model.predict_on_batch(self.input))[0]
+        except Exception as e:
+            print(f"Error in policy network: {e}")
+            return None
+        
+        keys = np.array([Position.from_board_move(move) for move in moves], dtype=np.uint16)
+        priors = np.zeros(len(moves), dtype=np.float32)
+        for i, key in enumerate(keys.tolist()):
+            index = self.move_index.get(Position.move_name(key))
+            if index is not None:
+                priors[i] = probabilities[index]
+        return keys, priors
+
+_nn_evaluator = None
+
+def warm_up_nn():
+    # Start loading the shared neural network evaluator in the background (once), returns it
+    global _nn_evaluator
+    if _nn_evaluator is None:
+        _nn_evaluator = NeuralNetworkEvaluator(background=True)
+    return _nn_evaluator
+
+MAX_PLY = 64
+MATE_SCORE = 10000  # mate in n plies scores MATE_SCORE - n for the side that mates
+INFINITY = float('inf')
+NULL_WINDOW = 0.001  # scores are in pawns, moves closer than this count as equal
+ASPIRATION_WINDOW = 0.5  # half a pawn either side of the previous iteration's score
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_PHASE = 6  # less non-pawn material than this (board.phase) is an endgame, no null moves
+MAX_BATCH = 256  # children evaluated by one forward pass
+PRIOR_OVERHEAD = 144  # bytes per policy cache entry besides its 6 bytes a move (OrderedDict slot, key, bytes object), measured
+POLICY_MIN_DEPTH = 2  # nodes closer to the leaves are ordered without the policy network
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # hash move, best captures and killers are never reduced
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node so they stay right when reached at another ply
+    if score > MATE_SCORE - 1000:
+        return score + ply
+    if score < -MATE_SCORE + 1000:
+        return score - ply
+    return score
+
+def score_from_tt(score, ply):
+    if score > MATE_SCORE - 1000:
+        return score - ply
+    if score < -MATE_SCORE + 1000:
+        return score + ply
+    return score
+
+class SearchAborted(Exception):
+    # Raised inside the search when the time or node budget runs out
+    pass
 
 class AIPlayer:
-    def __init__(self, depth=3, use_nn=True):
-        self.depth = depth
+    def __init__(self, depth=3, use_nn=True, tt_size_mb=16, time_limit=None, node_limit=None, quiescence_depth=6,
+                 eval_cache_mb=8, policy_top_k=None, policy_cache_mb=4, workers=1, book_path=DEFAULT_BOOK_PATH,
+                 endgame_dir=DEFAULT_TABLE_DIR):
+        self.depth = depth  # deepest iteration, the time limit usually stops the search first
+        self.quiescence_depth = quiescence_depth  # plies of captures searched past depth 0, 0 to turn off
+        self.time_limit = time_limit  # seconds per move, None for no limit
+        self.node_limit = node_limit
+        # Search results by position hash, kept between moves of the game
+        self.tt = TranspositionTable(tt_size_mb)
+        self.nodes = 0
+        self.deadline = None
+        self.max_nodes = None
+        self.can_abort = False
+        self.stop = None  # optional callable, True abandons the search (the game was reset)
+        # Where the last search got to, and the pondered search get_best_move can continue from
+        self.last_search = None
+        self.pondered = None
+        # Move ordering: two killer moves per ply and a history score per (side, from, to)
+        self.killers = [[0, 0] for ply in range(MAX_PLY)]
+        self.history = [0] * (2 * 64 * 64)
         
         # Try to use neural network if requested
-        if use_nn and TF_AVAILABLE:
-            self.evaluator = NeuralNetworkEvaluator()
-            print(f"AI Player initialized with neural network evaluation, depth {depth}")
+        if use_nn and nn_available():
+            self.evaluator = warm_up_nn()
+            print(f"AI Player initialized with neural network evaluation ({self.evaluator.status}), depth {depth}")
         else:
             self.evaluator = ImprovedEvaluator()
             print(f"AI Player initialized with improved evaluation, depth {depth}")
+        # Network scores by position hash, kept between moves of the game (eval_cache_mb megabytes).
+        # They are computed a batch of sibling positions at a time and looked up here
+        self.eval_cache = EvaluationCache(self.evaluator, eval_cache_mb)
+        self.batch_leaves = False
+        # Network input for a batch of children, the last slot holds their parent (no position has more than 218 moves)
+        self.input_batch = np.zeros((MAX_BATCH + 1, 8, 8, 12), dtype=np.float32)
+        # Policy model: move probabilities by position hash, one network call per interior node.
+        # With policy_top_k only that many quiet moves are searched at those nodes (captures always are)
+        self.use_policy = False
+        # Each position's priors are kept as one bytes object (uint16 move ints then float32 probabilities),
+        # least recently used first and at most policy_cache_mb megabytes in all
+        self.priors = OrderedDict()
+        self.priors_size = 0
+        self.priors_max_size = int(policy_cache_mb * 1024 * 1024)
+        self.policy_top_k = policy_top_k
+        # Opening book (book.py), memory-mapped so it costs nothing until a position is looked up
+        self.book = OpeningBook(book_path) if book_path and os.path.exists(book_path) else None
+        # KQK, KRK and KPK tables (tablebase.py), exact results for those endings without searching
+        tables = EndgameTables(endgame_dir) if endgame_dir else None
+        self.endgames = tables if tables else None  # None until tablebase.py has built them
+        # More than one worker splits the root moves over that many processes (see parallel.py).
+        # Worker processes can't be started from a daemon process such as the game's AIWorker
+        self.parallel = None
+        if workers > 1:
+            from parallel import ParallelSearch
+            settings = dict(depth=depth, use_nn=use_nn, tt_size_mb=tt_size_mb, quiescence_depth=quiescence_depth,
+                            eval_cache_mb=eval_cache_mb, policy_top_k=policy_top_k, policy_cache_mb=policy_cache_mb,
+                            endgame_dir=endgame_dir)
+            self.parallel = ParallelSearch(self, workers, settings)
+
+    def close(self):
+        # Stops the parallel search workers, if any. The player still searches on its own afterwards
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
 
-    def get_best_move(self, board_squares, color):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_best_move(self, board, color, time_limit=None, node_limit=None):
         print(f"AI thinking for {color}...")
-        best_score = float('-inf') if color == "white" else float('inf')
-        best_move = None
-        valid_moves_count = 0
-        all_valid_moves = []
+        move = self.book_move(board, color)
+        if move is not None:
+            print(f"Book move {Position.move_name(Position.from_board_move(move))}")
+            return move
+        move = self.endgame_move(board, color)
+        if move is not None:
+            print(f"Endgame table move {Position.move_name(Position.from_board_move(move))}")
+            return move
+        start = self.set_budget(time_limit, node_limit)
+        self.can_abort = False  # depth 1 always finishes so there is a move to play, unless stopped
+        # Ponder hit, the search on the opponent's time was of this very position and board
+        resume = self.pondered
+        self.pondered = None
+        if resume is not None and (resume["board"] is not board or resume["hash"] != board.hash or resume["depth"] == 0):
+            resume = None
+        if resume is None:
+            self.tt.new_search()
+            self.killers = [[0, 0] for ply in range(MAX_PLY)]
+            self.history = [score // 2 for score in self.history]  # older history counts for less
+        self.check_evaluator()
         
-        # Create a temporary board for move calculations
-        temp_board = Board()
-        temp_board.squares = board_squares
-        
-        # Find all valid moves for the AI's color
-        for row in range(ROWS):
-            for col in range(COLS):
-                square = board_squares[row][col]
-                if square.has_piece() and square.piece.color == color:
-                    piece = square.piece
-                    # Calculate possible moves for this piece
-                    temp_board.calc_moves(piece, row, col, bool=True)
-                    
-                    for move in piece.moves:
-                        all_valid_moves.append((piece, move))
-        
-        # Randomize move order for better search and less predictable play
-        random.shuffle(all_valid_moves)
+        if resume is not None:
+            # Carry on deepening from the pondered search, its tables and ordering are still in place
+            root_moves, best_move, score, completed = resume["root_moves"], resume["move"], resume["score"], resume["depth"]
+            self.can_abort = True
+            print(f"Ponder hit, continuing from depth {completed}")
+        else:
+            # Find all valid moves for the AI's color
+            root_moves = board.legal_moves(color)
+            if not root_moves:
+                return None
+            
+            # Shuffle first so equally ordered moves vary between games, then order properly
+            random.shuffle(root_moves)
+            entry = self.tt.probe(board.hash)
+            self.order_moves(root_moves, color, entry[3] if entry else 0, 0, self.move_priors(board, root_moves))
+            best_move = root_moves[0]
+            score = None
+            completed = 0
         
-        # Evaluate each move
-        for piece, move in all_valid_moves:
-            valid_moves_count += 1
+        # Iterative deepening, one ply at a time until the budget runs out
+        history_length = len(board.history)
+        for depth in range(completed + 1, self.depth + 1):
+            try:
+                move, score = self.aspiration_search(board, color, depth, root_moves, score)
+            except SearchAborted:
+                # Undo whatever the unfinished iteration left on the board
+                while len(board.history) > history_length:
+                    board.unmake_move()
+                print(f"Stopped during depth {depth}, playing the depth {depth - 1} move")
+                break
+            
+            best_move = move
+            completed = depth
+            # Previous iteration's best move is searched first next time
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            self.can_abort = True
+            self.tt.store(board.hash, depth, score, EXACT, Position.from_board_move(move))
+            print(f"Depth {depth}: score {score:.2f} for {color}, {self.nodes} nodes, {time.perf_counter() - start:.2f}s")
             
-            # Make the move
-            old_piece = board_squares[move.final.row][move.final.col].piece
-            board_squares[move.final.row][move.final.col].piece = piece
-            board_squares[move.initial.row][move.initial.col].piece = None
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                break
+        
+        self.last_search = {"board": board, "hash": board.hash, "depth": completed,
+                            "move": best_move, "score": score, "root_moves": root_moves}
+        stats = self.tt.stats()
+        print(f"TT hit rate {stats['hit_rate']:.1%}, fill {stats['fill']:.1%} of {stats['entries']} entries")
+        if self.batch_leaves:
+            stats = self.eval_cache.stats()
+            print(f"Eval cache hit rate {stats['hit_rate']:.1%}, {stats['entries']} of {stats['max_entries']} entries")
             
-            # Evaluate the move
-            if color == "white":
-                score = self.minimax(temp_board, self.depth - 1, False, float('-inf'), float('inf'))
-                if score > best_score:
-                    best_score = score
-                    best_move = move
+        return best_move
+
+    def book_move(self, board, color):
+        # Opening book move for the position if there is one, checked against the legal moves
+        if self.book is None:
+            return None
+        key = self.book.choose(board.hash)
+        if key is None:
+            return None
+        for move in board.legal_moves(color):
+            if Position.from_board_move(move) == key:
+                return move
+        return None
+
+    def probe_endgame(self, board, color, ply):
+        # Exact score from the endgame tables for a position with three pieces, None if it isn't in one.
+        # Mates score like the search's own, MATE_SCORE less the plies from the root
+        if self.endgames is None or board.piece_count != 3 or board.castling_rights():
+            return None
+        value = self.endgames.probe(board, color)
+        if value is None:
+            return None
+        if value > 0:
+            return MATE_SCORE - ply - value
+        if value < 0:
+            return -MATE_SCORE + ply - value - 1
+        return 0
+
+    def endgame_move(self, board, color):
+        # Best move by the endgame tables, the quickest mate or the slowest loss, None if the position isn't in them
+        if self.probe_endgame(board, color, 0) is None:
+            return None
+        enemy = "black" if color == "white" else "white"
+        best_move, best_score = None, -INFINITY
+        for move in board.legal_moves(color):
+            board.make_move(move.initial.piece, move)
+            score = self.probe_endgame(board, enemy, 1)
+            board.unmake_move()
+            # Not in a table: bare kings or a minor piece promotion, both draws
+            score = -score if score is not None else 0
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+    def set_budget(self, time_limit=None, node_limit=None):
+        # Limits for a new search, None for the player's own limits and 0 for none, returns the start time
+        time_limit = self.time_limit if time_limit is None else time_limit
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        self.max_nodes = self.node_limit if node_limit is None else node_limit
+        self.nodes = 0
+        return start
+
+    def check_evaluator(self):
+        # The model may still be loading in the background, search with the fallback until it's ready
+        model_ready = isinstance(self.evaluator, NeuralNetworkEvaluator) and self.evaluator.model is not None
+        batch_leaves = model_ready and not self.evaluator.policy
+        if batch_leaves != self.batch_leaves:
+            self.eval_cache.clear()  # fallback scores from before the model was ready
+        self.batch_leaves = batch_leaves
+        self.use_policy = model_ready and self.evaluator.policy
+
+    def ponder(self, board, color):
+        # Search on the opponent's time, board is the position expected after their reply.
+        # Runs until self.stop says so (or the depth limit), get_best_move continues from it
+        # if the game reaches this position with the same board
+        self.get_best_move(board, color, time_limit=0, node_limit=0)
+        self.pondered = self.last_search
+
+    def expected_reply(self, board, move, color):
+        # Opponent's best reply to move as far as the transposition table knows, or None
+        enemy = "black" if color == "white" else "white"
+        board.make_move(move.initial.piece, move)
+        entry = self.tt.probe(board.hash)
+        reply = None
+        if entry is not None and entry[3]:
+            for candidate in board.legal_moves(enemy):
+                if Position.from_board_move(candidate) == entry[3]:
+                    reply = candidate
+                    break
+        board.unmake_move()
+        return reply
+
+    def aspiration_search(self, board, color, depth, root_moves, previous_score):
+        # Narrow window around the previous iteration's score, widened and searched again on failure
+        if self.parallel is not None and depth >= 2:
+            return self.parallel.search_root(board, color, depth, root_moves)
+        if previous_score is None or depth < 3:
+            return self.search_root(board, color, depth, root_moves, -INFINITY, INFINITY)
+        
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous_score - delta, previous_score + delta
+        while True:
+            move, score = self.search_root(board, color, depth, root_moves, alpha, beta)
+            if alpha < score < beta:
+                return move, score
+            delta *= 4
+            if delta > 10:
+                alpha, beta = -INFINITY, INFINITY
+            elif score <= alpha:
+                alpha = score - delta
+            else:
+                beta = score + delta
+
+    def search_root(self, board, color, depth, root_moves, alpha, beta):
+        # Principal variation search over the root moves, scores are for color
+        enemy = "black" if color == "white" else "white"
+        best_score = -INFINITY
+        best_move = root_moves[0]
+        
+        # Evaluate each move, searching on the game board itself and undoing afterwards
+        for i, move in enumerate(root_moves):
+            board.make_move(move.initial.piece, move)
+            if i == 0:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, 1, enemy)
             else:
-                score = self.minimax(temp_board, self.depth - 1, True, float('-inf'), float('inf'))
-                if score < best_score:
-                    best_score = score
-                    best_move = move
+                score = -self.negamax(board, depth - 1, -alpha - NULL_WINDOW, -alpha, 1, enemy)
+                if alpha < score < beta:
+                    score = -self.negamax(board, depth - 1, -beta, -alpha, 1, enemy)
+            board.unmake_move()
             
-            # Undo the move
-            board_squares[move.initial.row][move.initial.col].piece = piece
-            board_squares[move.final.row][move.final.col].piece = old_piece
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
         
-        print(f"Analyzed {valid_moves_count} possible moves")
+        return best_move, best_score
+
+    def check_budget(self):
+        if self.stop is not None and self.stop():
+            raise SearchAborted()
+        if not self.can_abort:
+            return
+        if self.max_nodes and self.nodes >= self.max_nodes:
+            raise SearchAborted()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted()
         
-        # If no best move found (shouldn't happen in normal gameplay)
-        if best_move is None and len(all_valid_moves) > 0:
-            print("Warning: No best move found, selecting random move")
-            piece, move = random.choice(all_valid_moves)
-            best_move = move
+    def move_priors(self, board, moves):
+        # Policy network probabilities of moves by Position move int, None without a policy model
+        if not self.use_policy:
+            return None
+        entry = self.priors.get(board.hash)
+        if entry is not None:
+            self.priors.move_to_end(board.hash)
+            n = len(entry) // 6
+            keys = np.frombuffer(entry, dtype=np.uint16, count=n)
+            probabilities = np.frombuffer(entry, dtype=np.float32, offset=2 * n)
+            return dict(zip(keys.tolist(), probabilities.tolist()))
+        result = self.evaluator.move_priors(board, moves)
+        if result is None:
+            return None
+        keys, probabilities = result
+        entry = keys.tobytes() + probabilities.tobytes()
+        self.priors[board.hash] = entry
+        self.priors_size += len(entry) + PRIOR_OVERHEAD
+        while self.priors_size > self.priors_max_size and len(self.priors) > 1:
+            _, old = self.priors.popitem(last=False)
+            self.priors_size -= len(old) + PRIOR_OVERHEAD
+        return dict(zip(keys.tolist(), probabilities.tolist()))
+
+    def order_moves(self, moves, color, hash_move, ply, priors=None):
+        # Hash move, then captures by most valuable victim / least valuable attacker,
+        # then queen promotions, killer moves and finally quiet moves by history score.
+        # With policy priors the hash move stays first and the network orders the rest
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        side = 0 if color == "white" else 4096
+        history = self.history
+
+        def score(move):
+            key = Position.from_board_move(move)
+            if key == hash_move:
+                return 10_000_000
+            victim = move.final.piece
+            if victim is not None:
+                return 1_000_000 + piece_values[victim.name] * 100 - piece_values[move.initial.piece.name]
+            if move.promotion == "queen":
+                return 900_000
+            if key == killers[0] or key == killers[1]:
+                return 800_000
+            return history[side + (key & 4095)]
+
+        if priors is None:
+            moves.sort(key=score, reverse=True)
+        else:
+            def policy_score(move):
+                base = score(move)
+                return base >= 10_000_000, priors.get(Position.from_board_move(move), 0.0), base
+            moves.sort(key=policy_score, reverse=True)
+        return moves
+
+    def update_quiet_cutoff(self, move, color, depth, ply):
+        # Quiet move refuted this node, remember it for siblings and for the rest of the search
+        if move.final.piece is not None:
+            return
+        key = Position.from_board_move(move)
+        if ply < MAX_PLY and self.killers[ply][0] != key:
+            self.killers[ply][1] = self.killers[ply][0]
+            self.killers[ply][0] = key
+        self.history[(0 if color == "white" else 4096) + (key & 4095)] += depth * depth
+
+    def evaluate(self, board, color):
+        # Evaluators score from white's point of view, negamax wants the side to move's.
+        # Only network scores are cached, the static evaluation is a few running totals on the board
+        if self.batch_leaves:
+            score = self.eval_cache.evaluate_board(board)
+        else:
+            score = self.evaluator.evaluate_board(board)
+        return score if color == "white" else -score
+
+    def evaluate_children(self, board, moves):
+        # Score every child position with one batched forward pass instead of one predict per leaf,
+        # evaluate then finds them in the evaluation cache when the search gets there
+        # The parent is encoded once, each child is a copy with its move applied
+        parent = self.input_batch[-1]
+        ChessEncoder.board_to_matrix(board.squares, parent)
+        keys, basic_evals = [], []
+        for move in moves:
+            board.make_move(move.initial.piece, move)
+            if board.hash not in self.eval_cache:
+                slot = self.input_batch[len(keys)]
+                slot[...] = parent
+                ChessEncoder.apply_move(slot, board.history[-1])
+                keys.append(board.hash)
+                basic_evals.append(self.evaluator.fallback.evaluate_board(board))
+            board.unmake_move()
+        if keys:
+            for key, score in zip(keys, self.evaluator.evaluate_batch(self.input_batch[:len(keys)], basic_evals)):
+                self.eval_cache.put(key, score)
+
+    def quiescence(self, board, color, alpha, beta, depth):
+        # Captures and promotions only, the side to move may also stand pat on the static evaluation
+        stand_pat = self.evaluate(board, color)
+        if depth <= 0 or stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        
+        enemy = "black" if color == "white" else "white"
+        best_score = stand_pat
+        moves = self.order_moves(board.legal_moves(color, captures_only=True), color, 0, MAX_PLY)
+        if self.batch_leaves and len(moves) > 1:
+            self.evaluate_children(board, moves)
+        for move in moves:
+            self.nodes += 1
+            if self.nodes % 256 == 0:
+                self.check_budget()
             
-        return best_move
+            board.make_move(move.initial.piece, move)
+            score = -self.quiescence(board, enemy, -beta, -alpha, depth - 1)
+            board.unmake_move()
+            
+            best_score = max(best_score, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
         
-    def minimax(self, board, depth, maximizing, alpha, beta):
-        # Terminal node or max depth reached
-        if depth == 0:
-            return self.evaluator.evaluate(board.squares)
+        return best_score
+
+    def negamax(self, board, depth, alpha, beta, ply, color, allow_null=True):
+        # Principal variation search, scores are for the side to move (color)
+        self.nodes += 1
+        if self.nodes % 256 == 0:
+            self.check_budget()
         
-        if maximizing:  # White's turn (maximize)
-            max_eval = float('-inf')
-            for row in range(ROWS):
-                for col in range(COLS):
-                    square = board.squares[row][col]
-                    if square.has_piece() and square.piece.color == "white":
-                        piece = square.piece
-                        board.calc_moves(piece, row, col, bool=True)
-                        
-                        for move in piece.moves:
-                            # Make move
-                            old_piece = board.squares[move.final.row][move.final.col].piece
-                            board.squares[move.final.row][move.final.col].piece = piece
-                            board.squares[move.initial.row][move.initial.col].piece = None
-                            
-                            # Evaluate
-                            eval = self.minimax(board, depth - 1, False, alpha, beta)
-                            max_eval = max(max_eval, eval)
-                            
-                            # Undo move
-                            board.squares[move.initial.row][move.initial.col].piece = piece
-                            board.squares[move.final.row][move.final.col].piece = old_piece
-                            
-                            # Alpha-beta pruning
-                            alpha = max(alpha, eval)
-                            if beta <= alpha:
-                                break
-                                
-                    if beta <= alpha:
-                        break
-                        
-                if beta <= alpha:
-                    break
-                    
-            return max_eval
+        # Endgame tables know the exact result
+        score = self.probe_endgame(board, color, ply)
+        if score is not None:
+            return score
         
-        else:  # Black's turn (minimize)
-            min_eval = float('inf')
-            for row in range(ROWS):
-                for col in range(COLS):
-                    square = board.squares[row][col]
-                    if square.has_piece() and square.piece.color == "black":
-                        piece = square.piece
-                        board.calc_moves(piece, row, col, bool=True)
-                        
-                        for move in piece.moves:
-                            # Make move
-                            old_piece = board.squares[move.final.row][move.final.col].piece
-                            board.squares[move.final.row][move.final.col].piece = piece
-                            board.squares[move.initial.row][move.initial.col].piece = None
-                            
-                            # Evaluate
-                            eval = self.minimax(board, depth - 1, True, alpha, beta)
-                            min_eval = min(min_eval, eval)
-                            
-                            # Undo move
-                            board.squares[move.initial.row][move.initial.col].piece = piece
-                            board.squares[move.final.row][move.final.col].piece = old_piece
-                            
-                            # Alpha-beta pruning
-                            beta = min(beta, eval)
-                            if beta <= alpha:
-                                break
-                                
-                    if beta <= alpha:
-                        break
-                        
-                if beta <= alpha:
-                    break
-                    
-            return min_eval
\ No newline at end of file
+        # Max depth reached, settle the captures before evaluating
+        if depth <= 0:
+            return self.quiescence(board, color, alpha, beta, self.quiescence_depth)
+        
+        # Transposition table, an earlier search of this position may answer or narrow the window
+        hash_move = 0
+        entry = self.tt.probe(board.hash)
+        if entry is not None:
+            tt_depth, tt_score, tt_bound, hash_move = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if tt_depth >= depth:
+                if tt_bound == EXACT:
+                    return tt_score
+                elif tt_bound == LOWER:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
+        alpha_orig = alpha
+        enemy = "black" if color == "white" else "white"
+        in_check = board.is_in_check(color)
+        
+        # Null move pruning, if passing still fails high a real move will too.
+        # Not in check (passing would be illegal) and not in endgames where zugzwang is common,
+        # board.phase counts the non-pawn material and is kept up to date by make_move
+        if allow_null and depth >= NULL_MOVE_MIN_DEPTH and not in_check and beta < MATE_SCORE - 1000 \
+                and board.phase >= NULL_MOVE_MIN_PHASE:
+            reduction = 3 if depth > 6 else 2
+            board.make_null_move()
+            score = -self.negamax(board, depth - 1 - reduction, -beta, -beta + NULL_WINDOW, ply + 1, enemy, False)
+            board.unmake_move()
+            if score >= beta:
+                return beta
+        
+        moves = board.legal_moves(color)
+        if not moves:
+            # Checkmate, sooner is worse, or stalemate
+            return -MATE_SCORE + ply if in_check else 0
+        # Interior node, the policy network orders (and with policy_top_k prunes) the moves
+        priors = self.move_priors(board, moves) if depth >= POLICY_MIN_DEPTH else None
+        self.order_moves(moves, color, hash_move, ply, priors)
+        if priors is not None and self.policy_top_k and not in_check:
+            k = self.policy_top_k
+            moves = moves[:k] + [move for move in moves[k:] if move.final.piece is not None]
+        # Frontier node, every child goes straight to quiescence and needs a static score
+        if depth == 1 and self.batch_leaves:
+            self.evaluate_children(board, moves)
+        
+        best_score = -INFINITY
+        best_move = None
+        for i, move in enumerate(moves):
+            board.make_move(move.initial.piece, move)
+            if i == 0:
+                score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1, enemy)
+            else:
+                # Late move reductions, quiet moves far down the ordering are searched shallower first
+                reduction = 0
+                if depth >= LMR_MIN_DEPTH and i >= LMR_MIN_MOVES and not in_check and move.final.piece is None \
+                        and move.promotion is None and not board.is_in_check(enemy):
+                    reduction = 1 if i < 6 else 2
+                
+                # Null window scout, searched again with the full window only if it beats alpha
+                score = -self.negamax(board, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha, ply + 1, enemy)
+                if reduction and score > alpha:
+                    score = -self.negamax(board, depth - 1, -alpha - NULL_WINDOW, -alpha, ply + 1, enemy)
+                if alpha < score < beta:
+                    score = -self.negamax(board, depth - 1, -beta, -alpha, ply + 1, enemy)
+            board.unmake_move()
+            
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.update_quiet_cutoff(move, color, depth, ply)
+                break
+        
+        if best_score <= alpha_orig:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.tt.store(board.hash, depth, score_to_tt(best_score, ply), bound, Position.from_board_move(best_move))
+        
+        return best_score
@@ -0,0 +1,140 @@
+import multiprocessing
+import threading
+
+import pygame
+
+from position import Position
+
+# Posted on the pygame event queue when the worker has found a move,
+# event.request is the search it answers and event.move a Position move int (None when there is no move)
+AI_MOVE_EVENT = pygame.USEREVENT + 1
+
+NN_STATUS = ["loading", "ready", "unavailable", "off"]
+
+
+def _watch_nn(evaluator, nn_status):
+    evaluator.ready.wait()
+    nn_status.value = NN_STATUS.index(evaluator.status)
+
+
+def _ponder(player, board, move, color, stop):
+    # Play the move and the reply the engine expects, then search that position until stop()
+    reply = player.expected_reply(board, move, color)
+    if reply is None:
+        return None
+    board.make_move(move.initial.piece, move)
+    board.make_move(reply.initial.piece, reply)
+    player.stop = stop
+    player.ponder(board, color)
+    return board
+
+
+def _run(requests, results, cancelled, latest, nn_status, warm_up):
+    # Worker process: owns the AIPlayer, so its transposition table and caches live here between moves
+    from ai import AIPlayer, warm_up_nn
+
+    if warm_up:
+        threading.Thread(target=_watch_nn, args=(warm_up_nn(), nn_status), daemon=True).start()
+
+    player = None
+    ponder = False
+    pondered = None  # board of the last ponder search, reused on a ponder hit
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == "configure":
+            settings = dict(message[1])
+            ponder = settings.pop("ponder", False)
+            if player is not None:
+                player.close()
+            player = AIPlayer(**settings)
+            pondered = None
+        elif message[0] == "search":
+            request, fen = message[1], message[2]
+            if cancelled.value >= request or player is None:
+                results.put((request, None))
+                continue
+            player.stop = lambda request=request: cancelled.value >= request
+            position = Position(fen)
+            if pondered is not None and pondered.hash == position.hash:
+                board = pondered  # the opponent played the expected reply
+            else:
+                board = position.to_board()
+            pondered = None
+            move = player.get_best_move(board, position.turn)
+            # A search cancelled while it ran (reset) has no one waiting for its move
+            finished = cancelled.value < request
+            if finished:
+                results.put((request, Position.from_board_move(move) if move is not None else None))
+            
+            # Think on the opponent's time until the next request (or a cancel) comes in,
+            # not after a cancelled search whose position no longer exists
+            if ponder and finished and move is not None:
+                stop = lambda request=request: latest.value > request or cancelled.value >= request
+                pondered = _ponder(player, board, move, position.turn, stop)
+
+    if player is not None:
+        player.close()
+
+
+class AIWorker:
+    # Runs the AI search in a separate process so the pygame loop keeps drawing while it thinks.
+    # The result comes back as an AI_MOVE_EVENT, cancel() drops a search that is still running.
+
+    def __init__(self, warm_up_nn=False):
+        context = multiprocessing.get_context("spawn")  # no forked copy of the pygame display
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.cancelled = context.Value("q", 0)  # searches up to this request are abandoned
+        self.latest = context.Value("q", 0)  # newest request, a pondering worker stops when it changes
+        self.nn_status_value = context.Value("b", 0 if warm_up_nn else NN_STATUS.index("off"))
+        self.request = 0
+        self.pending = None  # request still being searched
+        self.process = context.Process(target=_run, daemon=True, name="ai-worker",
+                                       args=(self.requests, self.results, self.cancelled, self.latest,
+                                             self.nn_status_value, warm_up_nn))
+        self.process.start()
+        threading.Thread(target=self._deliver, daemon=True, name="ai-results").start()
+
+    @property
+    def thinking(self):
+        return self.pending is not None
+
+    @property
+    def nn_status(self):
+        return NN_STATUS[self.nn_status_value.value]
+
+    def configure(self, **settings):
+        "New AIPlayer in the worker, settings are AIPlayer arguments plus ponder=True to think on the opponent's time"
+        self.cancel()
+        self.requests.put(("configure", settings))
+
+    def start_search(self, board, color):
+        self.request += 1
+        self.pending = self.request
+        self.latest.value = self.request
+        self.requests.put(("search", self.request, Position.from_board(board, color).fen()))
+        return self.request
+
+    def cancel(self):
+        self.cancelled.value = self.request
+        self.pending = None
+
+    def finish(self, event):
+        "True if an AI_MOVE_EVENT answers the search still pending (and not a cancelled one)"
+        if event.request != self.pending:
+            return False
+        self.pending = None
+        return True
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+
+    def _deliver(self):
+        # Results thread, hands each finished search over to the main loop as a pygame event
+        while True:
+            request, move = self.results.get()
+            if request == self.pending:
+                pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, request=request, move=move))
@@ -2,10 +2,18 @@ from const import *
 from square import Square
 from piece import *
 from move import Move
-import copy
+from undo import Undo
 from sound import Sound
+from zobrist import hash_board, PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+from evaluation import piece_index, score_squares, MIDDLEGAME_SCORES, ENDGAME_SCORES, PHASE
 import os
 
+KNIGHT_JUMPS = [(-2, 1), (-2, -1), (2, 1), (2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+KING_STEPS = [(1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1)]
+DIAGONALS = [(-1, 1), (-1, -1), (1, 1), (1, -1)]
+ORTHOGONALS = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+PROMOTIONS = {"queen": Queen, "rook": Rook, "bishop": Bishop, "knight": Knight}
+
 
 class Board:
     def __init__(self):
@@ -14,6 +22,14 @@ class Board:
         self._add_pieces("white")
         self._add_pieces("black")
         self.last_move = None
+        self.en_passant_pawn = None
+        self.history = [] #stack of Undo records, see make_move / unmake_move
+        self.king_squares = {"white": (7, 4), "black": (0, 4)} #kept up to date by make_move
+        self.en_passant_col = None
+        self.hash = hash_board(self) #Zobrist key, white to move, updated incrementally by make_move
+        #Material + piece-square totals (middlegame, endgame) and game phase, also updated by make_move
+        self.eval_mg, self.eval_eg, self.phase = score_squares(self.squares)
+        self.piece_count = 32 #kings included, lets the AI spot endgames it has tables for
 
     def _create(self):  # underscore indicates a private function aka cannot be accessed outside the class
         for row in range(ROWS):
@@ -21,68 +37,200 @@ class Board:
                 self.squares[row][col] = Square(row, col)
 
     def move(self, piece, move, testing=False):
-        initial = move.initial
         final = move.final
 
-        #checks if target square is empty, for en passant ltr
-        en_passant_empty = self.squares[final.row][final.col].is_empty()
+        # console board move update, everything else is recorded so it can be undone
+        self.make_move(piece, move)
+        undo = self.history[-1]
 
-        # console board move update
-        self.squares[initial.row][initial.col].piece = None
-        self.squares[final.row][final.col].piece = piece
+        # En passant capture, the captured pawn was beside us rather than on the target square
+        if undo.captured and undo.captured_row != final.row and not testing:
+            sound = Sound(os.path.join("assets/sounds/capture.wav"))
+            sound.play()
 
-        #Pawn Promotion & En Passant
-        if isinstance(piece, Pawn):
-            #En passant
-            if move.en_passant_move:
-            # Remove the captured pawn (diagonal, but square behind)
-                self.squares[initial.row][final.col].piece = None
-                if not testing:
-                    sound = Sound(os.path.join("assets/sounds/capture.wav"))
-                    sound.play()
-            # Promotion
-            elif final.col - initial.col != 0 and en_passant_empty:
-                self.squares[initial.row][final.col].piece = None
-                self.squares[final.row][final.col].piece = piece
-                if not testing:
-                    sound = Sound(os.path.join("assets/sounds/capture.wav"))
-                    sound.play()
-            else:
-                self.check_promotion(piece, final)
+        # Clear valid moves
+        piece.clear_moves()
+        if undo.rook:
+            undo.rook.clear_moves()
 
-        # King Castling
-        if isinstance(piece, King):
-            if self.castling(initial, final) and not testing:
-                diff = final.col - initial.col
-                rook = piece.left_rook if (diff < 0) else piece.right_rook
-                self.move(rook, rook.moves[-1])
+    def make_move(self, piece, move):
+        "Play a move in place and push an Undo record so unmake_move can restore the board exactly"
+        initial = move.initial
+        final = move.final
+        undo = Undo(piece, move)
+        undo.en_passant_pawn = self.en_passant_pawn
+        undo.en_passant_col = self.en_passant_col
+        undo.last_move = self.last_move
+        undo.hash = self.hash
+        undo.scores = (self.eval_mg, self.eval_eg, self.phase, self.piece_count)
+        h = self.hash ^ SIDE_KEY
+        mg, eg, phase = self.eval_mg, self.eval_eg, self.phase
+
+        # Castling rights can only change when a king or rook home square is touched
+        touches_castling = (initial.row == 0 or initial.row == 7) and initial.col in (0, 4, 7) or \
+            (final.row == 0 or final.row == 7) and final.col in (0, 4, 7)
+        if touches_castling:
+            h ^= CASTLING_KEYS[self.castling_rights()]
+
+        # Captures, a no-op move (initial == final) is used to test the current position
+        if initial != final:
+            undo.captured = self.squares[final.row][final.col].piece
+
+        # En passant, pawn moving diagonally onto an empty square
+        if isinstance(piece, Pawn) and undo.captured is None and final.col != initial.col:
+            undo.captured = self.squares[initial.row][final.col].piece
+            undo.captured_row = initial.row
+            self.squares[initial.row][final.col].piece = None
+
+        if undo.captured is not None:
+            index = piece_index(undo.captured)
+            sq = undo.captured_row * 8 + undo.captured_col
+            h ^= PIECE_KEYS[index][sq]
+            mg -= MIDDLEGAME_SCORES[index][sq]
+            eg -= ENDGAME_SCORES[index][sq]
+            phase -= PHASE[index]
+            self.piece_count -= 1
+
+        self.squares[initial.row][initial.col].piece = None
+        self.squares[final.row][final.col].piece = piece
+        index = piece_index(piece)
+        sq = initial.row * 8 + initial.col
+        h ^= PIECE_KEYS[index][sq]
+        mg -= MIDDLEGAME_SCORES[index][sq]
+        eg -= ENDGAME_SCORES[index][sq]
+
+        # Promotion
+        if isinstance(piece, Pawn) and (final.row == 0 or final.row == 7):
+            self.check_promotion(piece, final, move.promotion)
+            undo.promoted = self.squares[final.row][final.col].piece
+            index = piece_index(undo.promoted)
+            phase += PHASE[index]
+        sq = final.row * 8 + final.col
+        h ^= PIECE_KEYS[index][sq]
+        mg += MIDDLEGAME_SCORES[index][sq]
+        eg += ENDGAME_SCORES[index][sq]
+
+        # King Castling, rook jumps to the other side of the king
+        if isinstance(piece, King) and self.castling(initial, final):
+            undo.rook_from = 7 if final.col > initial.col else 0
+            undo.rook_to = 5 if final.col > initial.col else 3
+            rook = self.squares[final.row][undo.rook_from].piece
+            if rook is not None:
+                undo.rook = rook
+                undo.rook_moved = rook.moved
+                self.squares[final.row][undo.rook_from].piece = None
+                self.squares[final.row][undo.rook_to].piece = rook
+                rook.moved = True
+                index = piece_index(rook)
+                rook_from, rook_to = final.row * 8 + undo.rook_from, final.row * 8 + undo.rook_to
+                h ^= PIECE_KEYS[index][rook_from] ^ PIECE_KEYS[index][rook_to]
+                mg += MIDDLEGAME_SCORES[index][rook_to] - MIDDLEGAME_SCORES[index][rook_from]
+                eg += ENDGAME_SCORES[index][rook_to] - ENDGAME_SCORES[index][rook_from]
 
         # move
         piece.moved = True
-
-        # Clear valid moves
-        piece.clear_moves()
+        if isinstance(piece, King):
+            self.king_squares[piece.color] = (final.row, final.col)
 
         # set last move
         self.last_move = move
 
-        # Clear all en passant flags
-        for row in self.squares:
-            for square in row:
-                if square.has_piece() and isinstance(square.piece, Pawn):
-                    square.piece.en_passant = False
+        # Clear en passant flag, only the pawn that just moved two squares can be taken en passant
+        if self.en_passant_pawn is not None:
+            self.en_passant_pawn.en_passant = False
+            self.en_passant_pawn = None
+            h ^= EN_PASSANT_KEYS[self.en_passant_col]
+            self.en_passant_col = None
 
-        # If pawn moved two squares, mark it as en passant target
         if isinstance(piece, Pawn) and abs(final.row - initial.row) == 2:
             piece.en_passant = True
+            self.en_passant_pawn = piece
+            self.en_passant_col = final.col
+            h ^= EN_PASSANT_KEYS[final.col]
+
+        if touches_castling:
+            h ^= CASTLING_KEYS[self.castling_rights()]
+        self.hash = h
+        self.eval_mg, self.eval_eg, self.phase = mg, eg, phase
+
+        self.history.append(undo)
+
+    def make_null_move(self):
+        "Pass the turn without moving (null move pruning in the search), undone by unmake_move"
+        undo = Undo(None, None)
+        undo.en_passant_pawn = self.en_passant_pawn
+        undo.en_passant_col = self.en_passant_col
+        undo.last_move = self.last_move
+        undo.hash = self.hash
+        self.hash ^= SIDE_KEY
+        if self.en_passant_pawn is not None:
+            self.hash ^= EN_PASSANT_KEYS[self.en_passant_col]
+            self.en_passant_pawn.en_passant = False
+            self.en_passant_pawn = None
+            self.en_passant_col = None
+        self.history.append(undo)
+
+    def unmake_move(self):
+        "Take back the last move played with make_move (or make_null_move)"
+        undo = self.history.pop()
+        piece = undo.piece
+        if piece is None:
+            self.en_passant_pawn = undo.en_passant_pawn
+            self.en_passant_col = undo.en_passant_col
+            if self.en_passant_pawn is not None:
+                self.en_passant_pawn.en_passant = True
+            self.hash = undo.hash
+            return undo
+        initial = undo.move.initial
+        final = undo.move.final
+
+        self.squares[final.row][final.col].piece = None
+        self.squares[initial.row][initial.col].piece = piece
+        if undo.captured is not None:
+            self.squares[undo.captured_row][undo.captured_col].piece = undo.captured
+
+        if undo.rook is not None:
+            self.squares[final.row][undo.rook_to].piece = None
+            self.squares[final.row][undo.rook_from].piece = undo.rook
+            undo.rook.moved = undo.rook_moved
+
+        piece.moved = undo.moved
+        if isinstance(piece, King):
+            self.king_squares[piece.color] = (initial.row, initial.col)
+        self.last_move = undo.last_move
+
+        if self.en_passant_pawn is not None:
+            self.en_passant_pawn.en_passant = False
+        self.en_passant_pawn = undo.en_passant_pawn
+        self.en_passant_col = undo.en_passant_col
+        if self.en_passant_pawn is not None:
+            self.en_passant_pawn.en_passant = True
+        self.hash = undo.hash
+        self.eval_mg, self.eval_eg, self.phase, self.piece_count = undo.scores
+
+        return undo
+
+    def castling_rights(self):
+        "Castling rights as bits (1 white kingside, 2 white queenside, 4 black kingside, 8 black queenside)"
+        rights = 0
+        for row, color, kingside, queenside in ((7, "white", 1, 2), (0, "black", 4, 8)):
+            king = self.squares[row][4].piece
+            if isinstance(king, King) and king.color == color and not king.moved:
+                rook = self.squares[row][7].piece
+                if isinstance(rook, Rook) and rook.color == color and not rook.moved:
+                    rights |= kingside
+                rook = self.squares[row][0].piece
+                if isinstance(rook, Rook) and rook.color == color and not rook.moved:
+                    rights |= queenside
+        return rights
 
     def valid_move(self, piece, move):
         return move in piece.moves
 
-    def check_promotion(self, piece, final):
+    def check_promotion(self, piece, final, promotion=None):
         if final.row == 0 or final.row == 7:
-            self.squares[final.row][final.col].piece = Queen(piece.color)
-            # now hardcoded queen, can edit to make it other pieces later
+            # queen unless the move asks for something else (UI moves always promote to queen)
+            self.squares[final.row][final.col].piece = PROMOTIONS[promotion or "queen"](piece.color)
 
     def castling(self, initial, final):
         return abs(initial.col - final.col) == 2
@@ -91,26 +239,67 @@ class Board:
         if not isinstance(piece,Pawn):
             return
 
-        for row in range(ROWS):
-            for col in range(COLS):
-                if isinstance(self.squares[row][col].piece,Pawn):
-                    self.squares[row][col].piece.en_passant = False
+        if self.en_passant_pawn is not None:
+            self.hash ^= EN_PASSANT_KEYS[self.en_passant_col]
+            self.en_passant_pawn.en_passant = False
 
         piece.en_passant = True
-
-    def in_check(self,piece,move): #Checks if ANY move made by the opponent can put us in check
-        temp_board = copy.deepcopy(self) #clone board
-        temp_piece = copy.deepcopy(piece)
-        temp_board.move(temp_piece, move,testing=True)
-
+        self.en_passant_pawn = piece
         for row in range(ROWS):
             for col in range(COLS):
-                if temp_board.squares[row][col].has_enemy_piece(piece.color):
-                    p = temp_board.squares[row][col].piece #just a piece
-                    temp_board.calc_moves(p, row, col, bool=False)
-                    for m in p.moves:
-                        if isinstance(m.final.piece, King):
+                if self.squares[row][col].piece is piece:
+                    self.en_passant_col = col
+        self.hash ^= EN_PASSANT_KEYS[self.en_passant_col]
+
+    def in_check(self,piece,move): #Checks if ANY move made by the opponent can put us in check
+        self.make_move(piece, move) #play it on this board, undone below
+        enemy = "black" if piece.color == "white" else "white"
+        row, col = self.king_squares[piece.color]
+        check = self.is_square_attacked(row, col, enemy)
+        self.unmake_move()
+        return check
+
+    def is_square_attacked(self, row, col, by_color):
+        "Check if a square is attacked by by_color, looking outward from the square instead of generating enemy moves"
+        squares = self.squares
+
+        # Knights
+        for row_incr, col_incr in KNIGHT_JUMPS:
+            r, c = row + row_incr, col + col_incr
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                p = squares[r][c].piece
+                if p is not None and p.color == by_color and p.name == "knight":
+                    return True
+
+        # Pawns, white pawns attack upwards so they sit one row below the square
+        r = row + 1 if by_color == "white" else row - 1
+        if 0 <= r < ROWS:
+            for c in (col - 1, col + 1):
+                if 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None and p.color == by_color and p.name == "pawn":
+                        return True
+
+        # King adjacency
+        for row_incr, col_incr in KING_STEPS:
+            r, c = row + row_incr, col + col_incr
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                p = squares[r][c].piece
+                if p is not None and p.color == by_color and p.name == "king":
+                    return True
+
+        # Sliding rays, stop at the first piece in each direction
+        for increments, sliders in ((DIAGONALS, ("bishop", "queen")), (ORTHOGONALS, ("rook", "queen"))):
+            for row_incr, col_incr in increments:
+                r, c = row + row_incr, col + col_incr
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None:
+                        if p.color == by_color and p.name in sliders:
                             return True
+                        break
+                    r += row_incr
+                    c += col_incr
 
         return False
     
@@ -343,6 +532,7 @@ class Board:
 
             # Castling Moves
             if not piece.moved:
+                enemy = "black" if piece.color == "white" else "white"
                 
                 # Kingside Castle (right rook)
                 right_rook = self.squares[row][7].piece
@@ -351,10 +541,7 @@ class Board:
                         # Check if any square is under attack: current, in-between, and destination
                         safe = True
                         for col_check in [4, 5, 6]:  # king moves from col 4 to 6
-                            temp_initial = Square(row, 4)
-                            temp_final = Square(row, col_check)
-                            test_move = Move(temp_initial, temp_final)
-                            if self.in_check(piece, test_move):
+                            if self.is_square_attacked(row, col_check, enemy):
                                 safe = False
                                 break
                         if safe:
@@ -373,10 +560,7 @@ class Board:
                         self.squares[row][3].is_empty()):
                         safe = True
                         for col_check in [4, 3, 2]:  # king moves from col 4 to 2
-                            temp_initial = Square(row, 4)
-                            temp_final = Square(row, col_check)
-                            test_move = Move(temp_initial, temp_final)
-                            if self.in_check(piece, test_move):
+                            if self.is_square_attacked(row, col_check, enemy):
                                 safe = False
                                 break
                         if safe:
@@ -426,46 +610,178 @@ class Board:
             king_moves()
 
     def is_in_check(self, color): #returns if king is currently in check or not
-        # Find king's position on board
-        king_piece = None
+        row, col = self.king_squares[color]
+        enemy = "black" if color == "white" else "white"
+        return self.is_square_attacked(row, col, enemy)
+
+    def legal_moves(self, color, captures_only=False):
+        "All legal moves of a side in one pass, using pin and check masks instead of testing every move"
+        # captures_only keeps captures and queen promotions only (used by the quiescence search)
+        squares = self.squares
+        enemy = "black" if color == "white" else "white"
+        king_row, king_col = self.king_squares[color]
+        moves = []
+
+        # Checkers and pins, looking outward from our king
+        checkers = 0
+        check_mask = None  # squares that block or capture the checker
+        pins = {}  # pinned piece square -> squares it may still move to
+        for increments, sliders in ((DIAGONALS, ("bishop", "queen")), (ORTHOGONALS, ("rook", "queen"))):
+            for row_incr, col_incr in increments:
+                ray = []
+                own = None
+                r, c = king_row + row_incr, king_col + col_incr
+                while 0 <= r < ROWS and 0 <= c < COLS:
+                    ray.append(r * 8 + c)
+                    p = squares[r][c].piece
+                    if p is not None:
+                        if p.color == color:
+                            if own is not None:
+                                break
+                            own = r * 8 + c
+                        else:
+                            if p.name in sliders:
+                                if own is None:
+                                    checkers += 1
+                                    check_mask = set(ray)
+                                else:
+                                    pins[own] = set(ray)
+                            break
+                    r += row_incr
+                    c += col_incr
+
+        for row_incr, col_incr in KNIGHT_JUMPS:
+            r, c = king_row + row_incr, king_col + col_incr
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                p = squares[r][c].piece
+                if p is not None and p.color == enemy and p.name == "knight":
+                    checkers += 1
+                    check_mask = {r * 8 + c}
+
+        r = king_row - 1 if color == "white" else king_row + 1
+        if 0 <= r < ROWS:
+            for c in (king_col - 1, king_col + 1):
+                if 0 <= c < COLS:
+                    p = squares[r][c].piece
+                    if p is not None and p.color == enemy and p.name == "pawn":
+                        checkers += 1
+                        check_mask = {r * 8 + c}
+
+        # King moves, tested with the king lifted off the board so it cannot hide behind itself
+        king = squares[king_row][king_col].piece
+        squares[king_row][king_col].piece = None
+        for row_incr, col_incr in KING_STEPS:
+            r, c = king_row + row_incr, king_col + col_incr
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                target = squares[r][c].piece
+                if target is None and captures_only:
+                    continue
+                if (target is None or target.color == enemy) and not self.is_square_attacked(r, c, enemy):
+                    moves.append(Move(Square(king_row, king_col, king), Square(r, c, target)))
+        squares[king_row][king_col].piece = king
+
+        # Double check, only the king can move
+        if checkers > 1:
+            return moves
+
+        # Castling, never out of check
+        if checkers == 0 and not king.moved and king_col == 4 and not captures_only:
+            for rook_col, between, path in ((7, (5, 6), (5, 6)), (0, (1, 2, 3), (3, 2))):
+                rook = squares[king_row][rook_col].piece
+                if isinstance(rook, Rook) and rook.color == color and not rook.moved:
+                    if all(squares[king_row][c].is_empty() for c in between) and \
+                            not any(self.is_square_attacked(king_row, c, enemy) for c in path):
+                        moves.append(Move(Square(king_row, 4, king), Square(king_row, path[-1])))
+
         for row in range(ROWS):
             for col in range(COLS):
-                piece = self.squares[row][col].piece
-                if isinstance(piece, King) and piece.color == color:
-                    king_piece = piece
-                    king_square = Square(row, col, piece)
-                    break
-            if king_piece:
-                break
+                piece = squares[row][col].piece
+                if piece is None or piece.color != color or piece is king:
+                    continue
+
+                # Target squares allowed by check and pin, None means anywhere
+                allowed = check_mask
+                pin = pins.get(row * 8 + col)
+                if pin is not None:
+                    allowed = pin if allowed is None else allowed & pin
+
+                name = piece.name
+                if name == "pawn":
+                    self._legal_pawn_moves(piece, row, col, allowed, moves, captures_only)
+                elif name == "knight":
+                    for row_incr, col_incr in KNIGHT_JUMPS:
+                        r, c = row + row_incr, col + col_incr
+                        if 0 <= r < ROWS and 0 <= c < COLS and (allowed is None or r * 8 + c in allowed):
+                            target = squares[r][c].piece
+                            if target is None and not captures_only or target is not None and target.color == enemy:
+                                moves.append(Move(Square(row, col, piece), Square(r, c, target)))
+                else:
+                    if name == "bishop":
+                        increments = DIAGONALS
+                    elif name == "rook":
+                        increments = ORTHOGONALS
+                    else:
+                        increments = DIAGONALS + ORTHOGONALS
+                    for row_incr, col_incr in increments:
+                        r, c = row + row_incr, col + col_incr
+                        while 0 <= r < ROWS and 0 <= c < COLS:
+                            target = squares[r][c].piece
+                            if target is not None and target.color == color:
+                                break
+                            if (allowed is None or r * 8 + c in allowed) and (target is not None or not captures_only):
+                                moves.append(Move(Square(row, col, piece), Square(r, c, target)))
+                            if target is not None:
+                                break
+                            r += row_incr
+                            c += col_incr
 
-        # Create a no-op move to simulate current board state
-        fake_move = Move(king_square, king_square)
-        return self.in_check(king_piece, fake_move)
+        return moves
 
-    def is_checkmate(self, color):
-        if not self.is_in_check(color):
-            return False
+    def _legal_pawn_moves(self, piece, row, col, allowed, moves, captures_only=False):
+        squares = self.squares
+        r = row + piece.dir
+        if not 0 <= r < ROWS:
+            return
+        start_row = 6 if piece.color == "white" else 1
+        promotion_row = 0 if piece.color == "white" else 7
 
-        for row in range(ROWS):
-            for col in range(COLS):
-                square = self.squares[row][col]
-                if square.has_piece() and square.piece.color == color:
-                    piece = square.piece
-                    self.calc_moves(piece, row, col, bool=True)
-                    if piece.moves:
-                        return False  # At least one legal move
-        return True  # In check and no legal moves
+        def add(final_row, final_col, target):
+            if final_row == promotion_row:
+                for promotion in PROMOTIONS:
+                    moves.append(Move(Square(row, col, piece), Square(final_row, final_col, target), promotion))
+            else:
+                moves.append(Move(Square(row, col, piece), Square(final_row, final_col, target)))
+
+        # Pushes, only a queen promotion counts when looking at captures
+        if squares[r][col].is_empty():
+            if allowed is None or r * 8 + col in allowed:
+                if not captures_only:
+                    add(r, col, None)
+                elif r == promotion_row:
+                    moves.append(Move(Square(row, col, piece), Square(r, col), "queen"))
+            r2 = r + piece.dir
+            if not captures_only and row == start_row and squares[r2][col].is_empty() and (allowed is None or r2 * 8 + col in allowed):
+                add(r2, col, None)
+
+        # Captures
+        for c in (col - 1, col + 1):
+            if 0 <= c < COLS:
+                target = squares[r][c].piece
+                if target is not None and target.color != piece.color and (allowed is None or r * 8 + c in allowed):
+                    add(r, c, target)
+
+        # En passant, rare enough to just play it and look, it can uncover a check along the rank
+        ep = self.en_passant_pawn
+        if ep is not None and ep.color != piece.color:
+            for c in (col - 1, col + 1):
+                if 0 <= c < COLS and squares[row][c].piece is ep:
+                    move = Move(Square(row, col, piece), Square(r, c, ep))
+                    move.en_passant_move = True
+                    if not self.in_check(piece, move):
+                        moves.append(move)
+
+    def is_checkmate(self, color):
+        return self.is_in_check(color) and not self.legal_moves(color)  # In check and no legal moves
     
     def is_stalemate(self, color):
-        if self.is_in_check(color):
-            return False
-
-        for row in range(ROWS):
-            for col in range(COLS):
-                square = self.squares[row][col]
-                if square.has_piece() and square.piece.color == color:
-                    piece = square.piece
-                    self.calc_moves(piece, row, col, bool=True)
-                    if piece.moves:
-                        return False  # Has legal move
-        return True  # Not in check, and no legal moves to be made
\ No newline at end of file
+        return not self.is_in_check(color) and not self.legal_moves(color)  # Not in check, and no legal moves to be made
@@ -0,0 +1,220 @@
+import argparse
+import collections
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from position import Position, FEN_PIECES, KING
+
+# Opening book: sorted fixed size records (position hash, move, times played), memory-mapped
+# by OpeningBook so it is never read into RAM and every process shares the same pages.
+# The hash is the Zobrist key of Board and Position, the move a Position move int.
+
+BOOK_DTYPE = np.dtype([("key", "<u8"), ("move", "<u4"), ("count", "<u4")])
+DEFAULT_BOOK_PATH = "./ai_models/opening_book.bin"
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+
+def parse_san(position, san):
+    "Position move int for a SAN move (e4, Nbd7, exd5, O-O, e8=Q), None if no legal move matches"
+    san = san.rstrip("+#!?")
+    moves = position.legal_moves()
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        col = 6 if len(san) == 3 else 2
+        for move in moves:
+            frm, to = move & 63, (move >> 6) & 63
+            if position.piece_at(frm) % 6 == KING and abs(to - frm) == 2 and to % 8 == col:
+                return move
+        return None
+
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        return None
+    piece, from_file, from_rank, target, promotion = match.groups()
+    piece = "PNBRQK".index(piece or "P")
+    to = (8 - int(target[1])) * 8 + ord(target[0]) - ord("a")
+    promotion = FEN_PIECES.index(promotion.lower()) if promotion else 0
+    for move in moves:
+        frm = move & 63
+        if (move >> 6) & 63 != to or move >> 12 != promotion or position.piece_at(frm) % 6 != piece:
+            continue
+        if from_file and frm % 8 != ord(from_file) - ord("a"):
+            continue
+        if from_rank and 8 - frm // 8 != int(from_rank):
+            continue
+        return move
+    return None
+
+
+def _san_moves(text):
+    # Movetext without comments, variations, annotations, move numbers and the result
+    text = re.sub(r"\{[^}]*\}", " ", text)
+    while "(" in text:
+        stripped = re.sub(r"\([^()]*\)", " ", text)
+        if stripped == text:
+            break
+        text = stripped
+    text = re.sub(r"\$\d+|\d+\.+", " ", text)
+    return [token for token in text.split() if token not in RESULTS]
+
+
+def read_games(lines):
+    "SAN moves of each game in a PGN stream, one list per game"
+    movetext = []
+    for line in lines:
+        line = line.split(";", 1)[0].strip()  # ; comments run to the end of the line
+        if line.startswith("["):
+            if movetext:
+                yield _san_moves(" ".join(movetext))
+                movetext = []
+        elif line:
+            movetext.append(line)
+    if movetext:
+        yield _san_moves(" ".join(movetext))
+
+
+def _write_run(counts, directory, runs):
+    # The counts so far as a sorted file of records, merged with the other runs at the end
+    if not counts:
+        return
+    records = np.array([(key, move, min(count, 2**32 - 1)) for (key, move), count in counts.items()], dtype=BOOK_DTYPE)
+    records.sort(order=("key", "move"))
+    path = os.path.join(directory, f"run{len(runs)}.bin")
+    records.tofile(path)
+    runs.append(path)
+
+
+def _merge_runs(runs, f, min_count, buckets=256):
+    # Every run is sorted by key, so a range of keys is one slice of each run. The slices of a
+    # range are added up, filtered and written before the next range is read, memory stays at
+    # about 1 / buckets of the runs
+    runs = [np.memmap(path, dtype=BOOK_DTYPE, mode="r") for path in runs]
+    if not runs:
+        return 0
+    bounds = [np.uint64(bucket << 56) for bucket in range(buckets)] + [None]
+    written = 0
+    for low, high in zip(bounds, bounds[1:]):
+        parts = []
+        for run in runs:
+            first = np.searchsorted(run["key"], low, "left")
+            last = np.searchsorted(run["key"], high, "left") if high is not None else len(run)
+            parts.append(run[first:last])
+        records = np.concatenate(parts)
+        if not len(records):
+            continue
+        records = records[np.lexsort((records["move"], records["key"]))]
+        # Same key and move in several runs: one record with the counts summed
+        starts = np.ones(len(records), dtype=bool)
+        starts[1:] = (records["key"][1:] != records["key"][:-1]) | (records["move"][1:] != records["move"][:-1])
+        starts = np.flatnonzero(starts)
+        counts = np.add.reduceat(records["count"].astype(np.uint64), starts)
+        merged = records[starts]
+        merged["count"] = np.minimum(counts, 2**32 - 1)
+        merged = merged[counts >= min_count]
+        merged.tofile(f)
+        written += len(merged)
+    return written
+
+
+def build(paths, out, max_plies=20, min_count=2, chunk_games=20000):
+    "Count the first max_plies moves of every game in the PGN files and write the book to out, if any move is left"
+    # Counts go to sorted temporary files every chunk_games games and are merged at the end,
+    # so memory doesn't grow with the number of games
+    counts = collections.Counter()
+    runs = []
+    games = 0
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)  # ai_models/ isn't in the repo
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out))) as directory:
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for sans in read_games(f):
+                    position = Position()
+                    for san in sans[:max_plies]:
+                        move = parse_san(position, san)
+                        if move is None:
+                            break
+                        counts[position.hash, move] += 1
+                        position.make_move(move)
+                    games += 1
+                    if games % chunk_games == 0:
+                        _write_run(counts, directory, runs)
+                        counts = collections.Counter()
+                    if games % 10000 == 0:
+                        print(f"{games} games, {len(runs)} runs, {time.perf_counter() - start:.0f}s")
+        _write_run(counts, directory, runs)
+
+        # Written next to out first, an existing book is only replaced by a non-empty one
+        with open(os.path.join(directory, "book.bin"), "wb") as f:
+            written = _merge_runs(runs, f, min_count)
+        if written:
+            os.replace(os.path.join(directory, "book.bin"), out)
+
+    if written:
+        print(f"{games} games, {written} book moves written to {out}")
+    else:
+        print(f"{games} games, no move was played {min_count} times or more, {out} not written")
+    return written
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_BOOK_PATH):
+        self.path = path
+        if os.path.getsize(path):
+            self.records = np.memmap(path, dtype=BOOK_DTYPE, mode="r")
+        else:
+            self.records = np.zeros(0, dtype=BOOK_DTYPE)  # empty file, no book moves (can't be mapped)
+        self.keys = self.records["key"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def moves(self, key):
+        "(move, count) of every move played from the position with this hash"
+        key = np.uint64(key)
+        first = np.searchsorted(self.keys, key, "left")
+        last = np.searchsorted(self.keys, key, "right")
+        entries = self.records[first:last]
+        return [(int(entry["move"]), int(entry["count"])) for entry in entries]
+
+    def choose(self, key, rng=random):
+        "A book move for the position, picked in proportion to how often it was played, or None"
+        moves = self.moves(key)
+        if not moves:
+            return None
+        return rng.choices([move for move, count in moves], weights=[count for move, count in moves])[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build the book from PGN files")
+    build_parser.add_argument("pgn", nargs="+")
+    build_parser.add_argument("--out", default=DEFAULT_BOOK_PATH)
+    build_parser.add_argument("--max-plies", type=int, default=20, help="moves from the start of each game to use")
+    build_parser.add_argument("--min-count", type=int, default=2, help="leave out moves played fewer times")
+    build_parser.add_argument("--chunk-games", type=int, default=20000, help="games counted in memory before a merge run is written")
+    probe_parser = commands.add_parser("probe", help="list the book moves of a position")
+    probe_parser.add_argument("--book", default=DEFAULT_BOOK_PATH)
+    probe_parser.add_argument("--fen", default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build(args.pgn, args.out, args.max_plies, args.min_count, args.chunk_games)
+    else:
+        position = Position(args.fen) if args.fen else Position()
+        book = OpeningBook(args.book)
+        for move, count in sorted(book.moves(position.hash), key=lambda entry: -entry[1]):
+            print(f"{Position.move_name(move)}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,4 +6,8 @@ HEIGHT = 640
 
 ROWS = 8
 COLS = 8
-SQSIZE = WIDTH // COLS
\ No newline at end of file
+SQSIZE = WIDTH // COLS
+
+#AI MODEL, saved by ai_train.ipynb and loaded by the AI, the move list of a policy model goes next to it
+MODEL_PATH = "./ai_models/TF_50EPOCHS.keras"
+MODEL_MOVES_PATH = MODEL_PATH.rsplit(".", 1)[0] + "_moves.json"
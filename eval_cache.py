@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    # Static evaluations by position hash (Zobrist), shared across searches of a game.
+    # Bounded, the least recently used entry goes first once it is full.
+    # Scores are from white's point of view, like the evaluators it wraps.
+
+    ENTRY_SIZE = 165  # bytes per entry of an OrderedDict of int keys and float scores, measured
+
+    def __init__(self, evaluator, size_mb=8):
+        self.evaluator = evaluator
+        self.size_mb = size_mb
+        self.max_entries = max(1, int(size_mb * 1024 * 1024) // self.ENTRY_SIZE)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        # Doesn't count as a lookup or refresh the entry
+        return key in self.entries
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        "Cached score for key, or None"
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def evaluate_board(self, board):
+        score = self.get(board.hash)
+        if score is None:
+            score = self.evaluator.evaluate_board(board)
+            self.put(board.hash, score)
+        return score
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "size_mb": self.size_mb,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,220 @@
+import numpy as np
+from const import *
+
+piece_values = {
+    "pawn": 1,
+    "knight": 3,
+    "bishop": 3,
+    "rook": 5,
+    "queen": 9,
+    "king": 100  # High value, but not so high it distorts calculations
+}
+
+# Piece-Square tables for positional evaluation
+# These tables provide bonus/penalty values for piece positions
+pawn_table = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5, 5, 10, 25, 25, 10, 5, 5],
+    [0, 0, 0, 20, 20, 0, 0, 0],
+    [5, -5, -10, 0, 0, -10, -5, 5],
+    [5, 10, 10, -20, -20, 10, 10, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+knight_table = [
+    [-50, -40, -30, -30, -30, -30, -40, -50],
+    [-40, -20, 0, 0, 0, 0, -20, -40],
+    [-30, 0, 10, 15, 15, 10, 0, -30],
+    [-30, 5, 15, 20, 20, 15, 5, -30],
+    [-30, 0, 15, 20, 20, 15, 0, -30],
+    [-30, 5, 10, 15, 15, 10, 5, -30],
+    [-40, -20, 0, 5, 5, 0, -20, -40],
+    [-50, -40, -30, -30, -30, -30, -40, -50]
+]
+
+bishop_table = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]
+]
+
+rook_table = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 10, 10, 10, 10, 10, 10, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 5, 5, 0, 0, 0]
+]
+
+queen_table = [
+    [-20, -10, -10, -5, -5, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 5, 5, 5, 0, -10],
+    [-5, 0, 5, 5, 5, 5, 0, -5],
+    [0, 0, 5, 5, 5, 5, 0, -5],
+    [-10, 5, 5, 5, 5, 5, 0, -10],
+    [-10, 0, 5, 0, 0, 0, 0, -10],
+    [-20, -10, -10, -5, -5, -10, -10, -20]
+]
+
+king_middle_table = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]
+]
+
+king_end_table = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+piece_position_tables = {
+    "pawn": pawn_table,
+    "knight": knight_table,
+    "bishop": bishop_table,
+    "rook": rook_table,
+    "queen": queen_table,
+    "king": king_middle_table  # Default to middle game
+}
+
+# Tapered evaluation: middlegame and endgame scores blended by game phase.
+# Phase counts minor pieces 1, rooks 2 and queens 4, so 24 is the starting position and 0 bare kings.
+# Only the king changes table between the two, everything else scores the same in both.
+PIECE_ORDER = ["pawn", "knight", "bishop", "rook", "queen", "king"]  # same order as ChessEncoder planes
+PHASE_WEIGHTS = {"pawn": 0, "knight": 1, "bishop": 1, "rook": 2, "queen": 4, "king": 0}
+MAX_PHASE = 24
+
+def _square_scores(endgame):
+    # SCORES[piece type + 6 for black][row * 8 + col], material plus position from white's point of view
+    scores = []
+    for color in ("white", "black"):
+        sign = 1 if color == "white" else -1
+        for name in PIECE_ORDER:
+            table = king_end_table if name == "king" and endgame else piece_position_tables[name]
+            row_scores = []
+            for row in range(ROWS):
+                for col in range(COLS):
+                    # For black pieces, we need to flip the table
+                    table_row = row if color == "white" else 7 - row
+                    row_scores.append(sign * (piece_values[name] + table[table_row][col] * 0.01))
+            scores.append(row_scores)
+    return scores
+
+MIDDLEGAME_SCORES = _square_scores(endgame=False)
+ENDGAME_SCORES = _square_scores(endgame=True)
+PHASE = [PHASE_WEIGHTS[name] for name in PIECE_ORDER] * 2
+
+PIECE_INDEX = {name: index for index, name in enumerate(PIECE_ORDER)}
+
+def piece_index(piece):
+    return PIECE_INDEX[piece.name] + (0 if piece.color == "white" else 6)
+
+def score_squares(board_squares):
+    "(middlegame, endgame, phase) totals for a whole board, Board keeps these up to date on every move"
+    middlegame = endgame = 0.0
+    phase = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board_squares[row][col].piece
+            if piece is not None:
+                index = piece_index(piece)
+                middlegame += MIDDLEGAME_SCORES[index][row * 8 + col]
+                endgame += ENDGAME_SCORES[index][row * 8 + col]
+                phase += PHASE[index]
+    return middlegame, endgame, phase
+
+def tapered(middlegame, endgame, phase):
+    phase = min(phase, MAX_PHASE)
+    return (middlegame * phase + endgame * (MAX_PHASE - phase)) / MAX_PHASE
+
+
+# Batch evaluation, the same material + piece-square + center control score for many positions
+# at once. A position is 12 planes of 64 squares (piece type + 6 for black, square row * 8 + col),
+# all planes of a batch are scored with a single matrix product against the tables below.
+CENTER_SQUARES = [3 * 8 + 3, 3 * 8 + 4, 4 * 8 + 3, 4 * 8 + 4]
+
+def _batch_weights():
+    # Columns: middlegame score, endgame score, phase. Center control does not depend on the
+    # phase, so adding it to both score columns gives the same tapered result as adding it after
+    weights = np.zeros((12, 64, 3), dtype=np.float32)
+    weights[:, :, 0] = MIDDLEGAME_SCORES
+    weights[:, :, 1] = ENDGAME_SCORES
+    weights[:, :, 2] = np.array(PHASE)[:, np.newaxis]
+    for sq in CENTER_SQUARES:
+        weights[:6, sq, :2] += 0.1
+        weights[6:, sq, :2] -= 0.1
+    return weights.reshape(12 * 64, 3)
+
+BATCH_WEIGHTS = _batch_weights()
+
+def _byte_scores():
+    # Bitboards are scored a byte (8 squares) at a time: BYTE_SCORES[(piece * 8 + byte) * 256 + value]
+    # is the middlegame + endgame * 1j total of the squares set in that byte, so a position is
+    # 96 lookups. Phase only depends on piece counts and is added up from popcounts instead
+    bits = ((np.arange(256)[:, np.newaxis] >> np.arange(8)) & 1).astype(np.float32)
+    weights = BATCH_WEIGHTS.reshape(12, 8, 8, 3)
+    scores = np.einsum("vk,pbkc->pbvc", bits, weights[..., :2])
+    return (scores[..., 0] + 1j * scores[..., 1]).astype(np.complex64).reshape(-1)
+
+BYTE_SCORES = _byte_scores()
+BYTE_OFFSETS = (np.arange(12 * 8) * 256).astype(np.int32)
+PHASE_WEIGHTS_ARRAY = np.array(PHASE, dtype=np.float32)
+SWAR_MASKS = [np.uint64(mask) for mask in (0x5555555555555555, 0x3333333333333333, 0x0F0F0F0F0F0F0F0F, 0x0101010101010101)]
+
+def popcount(bitboards):
+    "Set bits of each uint64, by parallel bit counting (np.bitwise_count needs NumPy 2)"
+    m1, m2, m4, h01 = SWAR_MASKS
+    x = bitboards - ((bitboards >> np.uint64(1)) & m1)
+    x = (x & m2) + ((x >> np.uint64(2)) & m2)
+    x = (x + (x >> np.uint64(4))) & m4
+    return (x * h01) >> np.uint64(56)
+
+def bitboards_to_planes(bitboards):
+    "(N, 12) array of piece bitboards (Position.pieces) to (N, 12, 64) uint8 planes"
+    bitboards = np.asarray(bitboards, dtype="<u8")
+    bits = np.unpackbits(bitboards.view(np.uint8).reshape(*bitboards.shape, 8), axis=-1, bitorder="little")
+    return bits
+
+def positions_to_bitboards(positions):
+    return np.array([position.pieces for position in positions], dtype=np.uint64)
+
+def evaluate_batch(planes):
+    "Scores from white's point of view for an (N, 12, 64) array of piece planes, as float32"
+    planes = np.asarray(planes)
+    totals = planes.reshape(len(planes), 12 * 64).astype(np.float32, copy=False) @ BATCH_WEIGHTS
+    phase = np.minimum(totals[:, 2], MAX_PHASE)
+    return (totals[:, 0] * phase + totals[:, 1] * (MAX_PHASE - phase)) / MAX_PHASE
+
+def evaluate_bitboards(bitboards, chunk_size=512):
+    "Same as evaluate_batch for an (N, 12) array of bitboards, from the byte tables above"
+    # About 3M positions/s on one core here, against 0.7M/s unpacking to planes for evaluate_batch.
+    # Small chunks keep the lookups in cache
+    bitboards = np.ascontiguousarray(bitboards, dtype="<u8")
+    scores = np.empty(len(bitboards), dtype=np.float32)
+    for start in range(0, len(bitboards), chunk_size):
+        chunk = bitboards[start:start + chunk_size]
+        totals = np.take(BYTE_SCORES, chunk.view(np.uint8).reshape(len(chunk), 12 * 8) + BYTE_OFFSETS).sum(axis=1)
+        phase = np.minimum(popcount(chunk).astype(np.float32) @ PHASE_WEIGHTS_ARRAY, MAX_PHASE)
+        scores[start:start + len(chunk)] = (totals.real * phase + totals.imag * (MAX_PHASE - phase)) / MAX_PHASE
+    return scores
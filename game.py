@@ -5,16 +5,17 @@ from dragger import Dragger
 from move import Move
 from config import Config
 from square import Square
-from ai import AIPlayer
+from position import Position
 
 class Game:
-    def __init__(self):
+    def __init__(self, ai_worker=None):
         self.next_player = "white"
         self.hovered_sqr = None
         self.board = Board()
         self.dragger = Dragger()
         self.config = Config()
         self.vs_ai = False
+        self.ai_worker = ai_worker  # searches in the background, kept over resets
         self.ai = None
         self.ai_color = None
         self.game_over = False
@@ -145,23 +146,40 @@ class Game:
     def check_game_over(self):
         return self.check_game_over_checkmate() #or self.check_game_over_stalemate()
     
+    def show_thinking(self,surface):
+        if self.ai is not None and self.ai.thinking:
+            #Animated dots so it's clear the window is alive
+            dots = "." * (pygame.time.get_ticks() // 400 % 4)
+            lbl = self.config.font.render(f"AI thinking{dots}", 1, (255, 255, 255))
+            background = pygame.Surface((lbl.get_width() + 20, lbl.get_height() + 10), pygame.SRCALPHA)
+            background.fill((0, 0, 0, 160))
+            surface.blit(background, (WIDTH // 2 - background.get_width() // 2, 5))
+            surface.blit(lbl, (WIDTH // 2 - lbl.get_width() // 2, 10))
+
     def try_ai_move(self):
-        if self.vs_ai and self.next_player == self.ai_color and not self.game_over:
-            move = self.ai.get_best_move(self.board.squares, self.ai_color)
-            if move:
-                piece = self.board.squares[move.initial.row][move.initial.col].piece
-                # Check if it's a capture
-                captured = self.board.squares[move.final.row][move.final.col].has_piece()
-                self.board.move(piece, move)
-                self.board.set_true_en_passant(piece)
-                self.play_sound(captured)
-                self.next_player = 'white' if self.next_player == "black" else "black"
-                self.check_game_over()
+        # Starts the search, the move arrives later as an AI_MOVE_EVENT handled by finish_ai_move
+        if self.vs_ai and self.next_player == self.ai_color and not self.game_over and not self.ai.thinking:
+            self.ai.start_search(self.board, self.ai_color)
+
+    def finish_ai_move(self, event):
+        if not self.vs_ai or not self.ai.finish(event) or self.game_over:
+            return
+        move = Position.to_board_move(event.move, self.board) if event.move is not None else None
+        if move:
+            piece = self.board.squares[move.initial.row][move.initial.col].piece
+            # Check if it's a capture
+            captured = self.board.squares[move.final.row][move.final.col].has_piece()
+            self.board.move(piece, move)
+            self.play_sound(captured)
+            self.next_player = 'white' if self.next_player == "black" else "black"
+            self.check_game_over()
     
-    def set_ai_mode(self, enable=True, ai_color="black", depth=3, use_nn=True):
+    def set_ai_mode(self, enable=True, ai_color="black", depth=3, use_nn=True, time_limit=None, ponder=False):
         self.vs_ai = enable
         self.ai_color = ai_color
-        self.ai = AIPlayer(depth=depth, use_nn=use_nn) if enable else None
+        self.ai = self.ai_worker if enable else None
+        if enable:
+            self.ai_worker.configure(depth=depth, use_nn=use_nn, time_limit=time_limit, ponder=ponder)
     
     def set_hover(self,row,col):
         self.hovered_sqr = self.board.squares[row][col]
@@ -176,4 +194,6 @@ class Game:
             self.config.move_sound.play()
 
     def reset(self):
-        self.__init__()
\ No newline at end of file
+        if self.ai is not None:
+            self.ai.cancel()
+        self.__init__(self.ai_worker)
\ No newline at end of file
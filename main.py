@@ -7,13 +7,19 @@ from const import *
 from game import Game
 from square import Square
 from move import Move
+from ai import nn_available
+from ai_worker import AIWorker, AI_MOVE_EVENT
 
 class Main:
     def __init__(self):
         pygame.init()
         self.screen = pygame.display.set_mode((WIDTH,HEIGHT))
         pygame.display.set_caption("Personal Chessboard")
-        self.game = Game()
+        # The AI searches in its own process, which also loads the neural net in the background
+        # while the title screen is up
+        self.ai_worker = AIWorker(warm_up_nn=nn_available())
+        self.game = Game(self.ai_worker)
+        self.clock = pygame.time.Clock()
         self.mode = "title"
         self.player_color = None
 
@@ -49,6 +55,19 @@ class Main:
         self.screen.blit(ai_advanced_text, (self.ai_advanced_button.centerx - ai_advanced_text.get_width() // 2,
                                      self.ai_advanced_button.centery - ai_advanced_text.get_height() // 2))
 
+        # Neural net status, the mode still works while loading but plays with the basic evaluation
+        if self.ai_worker.nn_status == "off":
+            status = "Neural net unavailable (TensorFlow not installed)"
+        elif self.ai_worker.nn_status == "loading":
+            status = "Neural net loading..."
+        elif self.ai_worker.nn_status == "ready":
+            status = "Neural net ready"
+        else:
+            status = "Neural net unavailable, using basic evaluation"
+        status_font = pygame.font.SysFont("arial", 20)
+        status_text = status_font.render(status, True, (200, 200, 200))
+        self.screen.blit(status_text, (WIDTH // 2 - status_text.get_width() // 2, self.ai_advanced_button.bottom + 10))
+
     def mainloop(self):
         game = self.game
         screen = self.screen
@@ -68,11 +87,18 @@ class Main:
                 if dragger.dragging:
                     dragger.update_blit(screen)
 
+                game.show_thinking(screen)
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    self.ai_worker.close()
                     pygame.quit()
                     sys.exit()
 
+                if event.type == AI_MOVE_EVENT:
+                    game.finish_ai_move(event)
+                    continue
+
                 if self.mode == "title":
                     if event.type == pygame.MOUSEBUTTONDOWN:
                         if self.hvh_button.collidepoint(event.pos):
@@ -91,13 +117,12 @@ class Main:
                             ai_color = "black" if self.player_color == "white" else "white"
                             print(f"Human is: {self.player_color}, AI is: {ai_color}")
                             
-                            # Use simple evaluation, depth 2
-                            game.set_ai_mode(enable=True, ai_color=ai_color, depth=2, use_nn=False) 
+                            # Use simple evaluation, deepen for up to 2 seconds a move and keep thinking on the human's time
+                            game.set_ai_mode(enable=True, ai_color=ai_color, depth=8, use_nn=False, time_limit=2.0, ponder=True) 
                             
                             # If AI is white, it should make the first move
                             if ai_color == "white":
                                 print("AI should make first move")
-                                pygame.display.update()  # Update display before AI thinks
                                 game.try_ai_move()
                                 
                         elif self.ai_advanced_button.collidepoint(event.pos):
@@ -109,13 +134,12 @@ class Main:
                             ai_color = "black" if self.player_color == "white" else "white"
                             print(f"Human is: {self.player_color}, AI is: {ai_color}")
                             
-                            # Use neural network, depth 2
-                            game.set_ai_mode(enable=True, ai_color=ai_color, depth=1, use_nn=True) 
+                            # Use neural network, deepen for up to 3 seconds a move and keep thinking on the human's time
+                            game.set_ai_mode(enable=True, ai_color=ai_color, depth=4, use_nn=True, time_limit=3.0, ponder=True) 
                             
                             # If AI is white, it should make the first move
                             if ai_color == "white":
                                 print("AI should make first move")
-                                pygame.display.update()  # Update display before AI thinks
                                 game.try_ai_move()
 
                 elif self.mode == "game":
@@ -133,6 +157,7 @@ class Main:
                                 if board.squares[clicked_row][clicked_col].has_piece():
                                     piece = board.squares[clicked_row][clicked_col].piece
                                     if piece.color == game.next_player:
+                                        piece.clear_moves()
                                         board.calc_moves(piece, clicked_row, clicked_col, bool=True)
                                         dragger.save_initial(event.pos)
                                         dragger.drag_piece(piece)
@@ -171,7 +196,6 @@ class Main:
                                 if board.valid_move(dragger.piece, move):
                                     captured = board.squares[released_row][released_col].has_piece()
                                     board.move(dragger.piece, move)
-                                    board.set_true_en_passant(dragger.piece)
                                     game.play_sound(captured)
                                     game.show_bg(screen)
                                     game.show_last_move(screen)
@@ -193,6 +217,7 @@ class Main:
                             dragger = self.game.dragger
 
             pygame.display.update()
+            self.clock.tick(60)  # leave the CPU to the AI process between frames
         
 
 
@@ -1,9 +1,10 @@
 class Move:
 
-    def __init__(self,initial,final):
+    def __init__(self,initial,final,promotion=None):
         self.initial = initial
         self.final = final
         self.en_passant_move = False
+        self.promotion = promotion #name of the piece a pawn promotes to, None means queen
 
     def __eq__(self,other):
-        return self.initial == other.initial and self.final == other.final
+        return self.initial == other.initial and self.final == other.final and self.promotion == other.promotion
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# Forward pass of the evaluation network in plain NumPy, so the NN mode runs without TensorFlow.
+# export_model (needs TensorFlow) writes the weights of a Keras model to an .npz file,
+# NumpyModel.load reads it back with NumPy only.
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "softmax": softmax,
+}
+
+
+def quantize(kernel):
+    "Symmetric int8 weights with one float32 scale per output channel (last axis)"
+    axes = tuple(range(kernel.ndim - 1))
+    scale = np.abs(kernel).max(axis=axes) / 127
+    scale[scale == 0] = 1
+    return np.round(kernel / scale).astype(np.int8), scale.astype(np.float32)
+
+
+def export_model(model, path, int8=False):
+    "Save the layers of a Keras Sequential model to path (.npz) in the format NumpyModel.load reads"
+    layers = []
+    arrays = {}
+    for i, layer in enumerate(model.layers):
+        kind = type(layer).__name__
+        config = layer.get_config()
+        spec = {"type": kind}
+        weights = layer.get_weights()
+        if kind in ("Conv2D", "Dense"):
+            if kind == "Conv2D" and (tuple(config["strides"]) != (1, 1) or tuple(config.get("dilation_rate", (1, 1))) != (1, 1)):
+                raise ValueError(f"{layer.name}: only stride 1, undilated convolutions are supported")
+            spec["activation"] = config["activation"]
+            spec["padding"] = config.get("padding", "valid")
+            kernel = weights[0].astype(np.float32)
+            if int8:
+                arrays[f"{i}.kernel"], arrays[f"{i}.kernel_scale"] = quantize(kernel)
+            else:
+                arrays[f"{i}.kernel"] = kernel
+            arrays[f"{i}.bias"] = weights[1].astype(np.float32) if config["use_bias"] else np.zeros(kernel.shape[-1], np.float32)
+        elif kind == "BatchNormalization":
+            # Folded into a per-channel multiply and add, inference only
+            gamma = weights.pop(0) if config["scale"] else 1
+            beta = weights.pop(0) if config["center"] else 0
+            mean, variance = weights
+            scale = gamma / np.sqrt(variance + config["epsilon"])
+            arrays[f"{i}.scale"] = np.broadcast_to(scale, mean.shape).astype(np.float32)
+            arrays[f"{i}.shift"] = (beta - mean * scale).astype(np.float32)
+        elif kind in ("Flatten", "Dropout", "InputLayer"):
+            pass
+        else:
+            raise ValueError(f"{layer.name}: {kind} layers are not supported")
+        layers.append(spec)
+    np.savez(path, layers=json.dumps(layers), **arrays)
+
+
+class NumpyModel:
+    # Same predict_on_batch as a Keras model, NeuralNetworkEvaluator can use either
+
+    def __init__(self, layers, arrays):
+        self.layers = []
+        for i, spec in enumerate(layers):
+            kind = spec["type"]
+            if kind in ("Conv2D", "Dense"):
+                kernel = arrays[f"{i}.kernel"]
+                if kernel.dtype == np.int8:
+                    kernel = kernel.astype(np.float32) * arrays[f"{i}.kernel_scale"]
+                bias = arrays[f"{i}.bias"]
+                activation = ACTIVATIONS[spec["activation"]]
+                if kind == "Conv2D":
+                    kh, kw, channels, filters = kernel.shape
+                    # Kernel as a matrix, a convolution is then one product per batch
+                    self.layers.append((self.conv2d, (kernel.reshape(kh * kw * channels, filters), kh, kw, spec["padding"], bias, activation)))
+                else:
+                    self.layers.append((self.dense, (kernel, bias, activation)))
+            elif kind == "BatchNormalization":
+                self.layers.append((self.batch_norm, (arrays[f"{i}.scale"], arrays[f"{i}.shift"])))
+            elif kind == "Flatten":
+                self.layers.append((self.flatten, ()))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files if name != "layers"}
+            layers = json.loads(str(data["layers"]))
+        return cls(layers, arrays)
+
+    @staticmethod
+    def conv2d(x, matrix, kh, kw, padding, bias, activation):
+        if padding == "same":
+            x = np.pad(x, ((0, 0), ((kh - 1) // 2, kh // 2), ((kw - 1) // 2, kw // 2), (0, 0)))
+        # (N, H, W, C, kh, kw) windows, reordered to match the (kh, kw, C) kernel rows
+        windows = np.lib.stride_tricks.sliding_window_view(x, (kh, kw), axis=(1, 2))
+        n, height, width = windows.shape[:3]
+        columns = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * height * width, -1)
+        return activation(columns @ matrix + bias).reshape(n, height, width, -1)
+
+    @staticmethod
+    def dense(x, kernel, bias, activation):
+        return activation(x @ kernel + bias)
+
+    @staticmethod
+    def batch_norm(x, scale, shift):
+        return x * scale + shift
+
+    @staticmethod
+    def flatten(x):
+        return x.reshape(len(x), -1)
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for layer, args in self.layers:
+            x = layer(x, *args)
+        return x
+
+    __call__ = predict_on_batch
+
+
+def sample_inputs(count, seed=0):
+    "Encoded positions from random games, to compare the two forward passes on"
+    import random
+    from ai import ChessEncoder
+    from position import Position
+
+    rng = random.Random(seed)
+    matrices = []
+    while len(matrices) < count:
+        position = Position()
+        for ply in range(rng.randint(0, 80)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        matrices.append(ChessEncoder.board_to_matrix(position.to_board().squares))
+    return np.concatenate(matrices)
+
+
+def check_parity(keras_model, numpy_model, inputs):
+    "Largest absolute difference between the Keras and NumPy outputs for the same inputs"
+    expected = np.asarray(keras_model.predict(inputs, verbose=0))
+    return float(np.abs(numpy_model.predict_on_batch(inputs) - expected).max())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a Keras evaluation model for NumPy inference")
+    parser.add_argument("model", help=".h5 or .keras model file")
+    parser.add_argument("--out", help="output .npz file, defaults to the model path with .npz")
+    parser.add_argument("--int8", action="store_true", help="store the weights int8-quantized")
+    parser.add_argument("--samples", type=int, default=256, help="positions to compare the outputs on")
+    parser.add_argument("--tolerance", type=float, help="largest difference allowed (default 1e-4, 0.05 with --int8)")
+    args = parser.parse_args(argv)
+
+    import tensorflow as tf
+
+    out = args.out or os.path.splitext(args.model)[0] + ".npz"
+    keras_model = tf.keras.models.load_model(args.model, compile=False, safe_mode=False)
+    export_model(keras_model, out, args.int8)
+    print(f"Exported {args.model} to {out}")
+
+    numpy_model = NumpyModel.load(out)
+    difference = check_parity(keras_model, numpy_model, sample_inputs(args.samples))
+    tolerance = args.tolerance if args.tolerance is not None else (0.05 if args.int8 else 1e-4)
+    print(f"Max difference from Keras over {args.samples} positions: {difference:.2e} "
+          f"({'OK' if difference <= tolerance else 'FAIL'}, tolerance {tolerance:.0e})")
+    return 0 if difference <= tolerance else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import argparse
+import multiprocessing
+import queue
+import sys
+import time
+
+from position import Position, START_FEN
+
+# Parallel root search for AIPlayer(workers=n). The first root move is searched by the player itself
+# to get a bound, the other root moves are handed out one at a time to worker processes that all
+# share that alpha and raise it as they find better moves (each worker keeps its own tables).
+
+BENCHMARK_POSITIONS = [
+    ("start", START_FEN),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+]
+
+
+def _worker(settings, tasks, results, alpha, next_move, stop):
+    from ai import AIPlayer, SearchAborted, INFINITY, NULL_WINDOW
+
+    player = AIPlayer(**settings)
+    player.stop = lambda: stop.value
+    results.put((0, None, 0))  # ready
+    fen = board = color = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        search, task_fen, depth, keys, time_left = task
+        if task_fen != fen:
+            # New root position, the tables of the last one are worth less
+            fen = task_fen
+            position = Position(fen)
+            board, color = position.to_board(), position.turn
+            player.tt.new_search()
+            player.killers = [[0, 0] for ply in range(len(player.killers))]
+        moves = {Position.from_board_move(move): move for move in board.legal_moves(color)}
+        enemy = "black" if color == "white" else "white"
+
+        player.set_budget(time_left, 0)
+        player.can_abort = True
+        player.check_evaluator()
+        history_length = len(board.history)
+        try:
+            while True:
+                with next_move.get_lock():
+                    index = next_move.value
+                    next_move.value += 1
+                if index >= len(keys):
+                    break
+                move = moves[keys[index]]
+                bound = alpha.value
+                board.make_move(move.initial.piece, move)
+                # Null window against the best score so far, searched fully only if it may be better
+                score = -player.negamax(board, depth - 1, -bound - NULL_WINDOW, -bound, 1, enemy)
+                if score > bound:
+                    score = -player.negamax(board, depth - 1, -INFINITY, -bound, 1, enemy)
+                board.unmake_move()
+                with alpha.get_lock():
+                    if score > alpha.value:
+                        alpha.value = score
+                results.put((search, index, score))
+        except SearchAborted:
+            while len(board.history) > history_length:
+                board.unmake_move()
+        results.put((search, None, player.nodes))
+
+
+class ParallelSearch:
+    def __init__(self, player, workers, settings):
+        context = multiprocessing.get_context("spawn")
+        self.player = player
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.alpha = context.Value("d", 0.0)  # best root score so far, shared by the workers
+        self.next_move = context.Value("i", 0)  # next root move to hand out
+        self.stop = context.Value("b", 0)
+        self.search = 0
+        self.processes = [context.Process(target=_worker, daemon=True, name=f"search-{i}",
+                                          args=(settings, self.tasks, self.results, self.alpha, self.next_move, self.stop))
+                          for i in range(workers)]
+        for process in self.processes:
+            process.start()
+
+    def wait_ready(self):
+        # Block until every worker has started, they need a moment to import everything
+        for process in self.processes:
+            while self.results.get()[0] != 0:
+                pass
+
+    def close(self, timeout=5):
+        # Ask every worker to exit and wait for them, the ones still busy after timeout are killed
+        for process in self.processes:
+            self.tasks.put(None)
+        self.stop.value = 1
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def search_root(self, board, color, depth, root_moves):
+        # Full window search of the root moves, same result as AIPlayer.search_root.
+        # Raises SearchAborted when the budget runs out before every move is searched
+        from ai import SearchAborted, INFINITY
+
+        player = self.player
+        enemy = "black" if color == "white" else "white"
+        best_move = root_moves[0]
+        board.make_move(best_move.initial.piece, best_move)
+        best_score = -player.negamax(board, depth - 1, -INFINITY, INFINITY, 1, enemy)
+        board.unmake_move()
+        if len(root_moves) == 1:
+            return best_move, best_score
+
+        self.search += 1
+        self.alpha.value = best_score
+        self.next_move.value = 0
+        self.stop.value = 0
+        keys = [Position.from_board_move(move) for move in root_moves[1:]]
+        fen = Position.from_board(board, color).fen()
+        time_left = max(player.deadline - time.perf_counter(), 0.001) if player.deadline is not None else 0
+        for process in self.processes:
+            self.tasks.put((self.search, fen, depth, keys, time_left))
+
+        scores = [None] * len(keys)
+        running = len(self.processes)
+        while running:
+            try:
+                search, index, value = self.results.get(timeout=0.05)
+            except queue.Empty:
+                if player.stop is not None and player.stop():
+                    self.stop.value = 1  # the game was reset, workers give up too
+                continue
+            if search != self.search:
+                continue
+            if index is None:
+                running -= 1
+                player.nodes += value
+            else:
+                scores[index] = value
+
+        if None in scores:
+            raise SearchAborted()
+        for move, score in zip(root_moves[1:], scores):
+            if score > best_score:
+                best_move, best_score = move, score
+        return best_move, best_score
+
+
+def benchmark(worker_counts, depth, positions=BENCHMARK_POSITIONS, out=sys.stdout):
+    "Time to finish a fixed depth search for each worker count, with the speedup over 1 (the serial search)"
+    from ai import AIPlayer
+
+    print(f"{multiprocessing.cpu_count()} CPUs, depth {depth}", file=out)
+    for name, fen in positions:
+        baseline = None
+        for workers in worker_counts:
+            with AIPlayer(depth=depth, use_nn=False, workers=workers) as player:
+                if player.parallel is not None:
+                    player.parallel.wait_ready()
+                position = Position(fen)
+                board = position.to_board()
+                start = time.perf_counter()
+                player.get_best_move(board, position.turn)
+                elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{name:<11} workers {workers:>2}  {elapsed:8.2f}s  {player.nodes:>9} nodes  "
+                  f"speedup {baseline / elapsed:5.2f}x", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel search speedup by number of worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--depth", type=int, default=5)
+    args = parser.parse_args(argv)
+    benchmark(args.workers, args.depth)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import sys
+import time
+
+from position import Position, START_FEN
+
+# Well known perft positions and their leaf counts from depth 1 upwards
+# (https://www.chessprogramming.org/Perft_Results)
+PERFT_POSITIONS = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("talkchess", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(position, depth):
+    "Number of leaf nodes depth plies below a Position"
+    if depth == 0:
+        return 1
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def perft_board(board, depth, color):
+    "Same count on the UI Board, through Board.legal_moves and make_move / unmake_move"
+    if depth == 0:
+        return 1
+    moves = board.legal_moves(color)
+    if depth == 1:
+        return len(moves)
+    enemy = "black" if color == "white" else "white"
+    nodes = 0
+    for move in moves:
+        board.make_move(move.initial.piece, move)
+        nodes += perft_board(board, depth - 1, enemy)
+        board.unmake_move()
+    return nodes
+
+
+def divide(fen, depth, use_board=False):
+    "Leaf count below each root move, keyed by move name (e2e4, a7a8q)"
+    position = Position(fen)
+    counts = {}
+    if use_board:
+        board = position.to_board()
+        color = position.turn
+        enemy = "black" if color == "white" else "white"
+        for move in board.legal_moves(color):
+            board.make_move(move.initial.piece, move)
+            counts[Position.move_name(Position.from_board_move(move))] = perft_board(board, depth - 1, enemy)
+            board.unmake_move()
+    else:
+        for move in position.legal_moves():
+            position.make_move(move)
+            counts[Position.move_name(move)] = perft(position, depth - 1)
+            position.unmake_move()
+    return counts
+
+
+def count(fen, depth, use_board=False):
+    position = Position(fen)
+    if use_board:
+        return perft_board(position.to_board(), depth, position.turn)
+    return perft(position, depth)
+
+
+def run_suite(depth, use_board=False, out=sys.stdout):
+    "Run every reference position up to depth, returns True when every count matches"
+    passed = True
+    for name, fen, expected in PERFT_POSITIONS:
+        for d in range(1, min(depth, len(expected)) + 1):
+            start = time.perf_counter()
+            nodes = count(fen, d, use_board)
+            elapsed = time.perf_counter() - start
+            ok = nodes == expected[d - 1]
+            passed = passed and ok
+            nps = nodes / elapsed if elapsed > 0 else 0
+            print(f"{name:<11} depth {d}  nodes {nodes:>10}  expected {expected[d - 1]:>10}  "
+                  f"{'OK' if ok else 'FAIL':<4}  {elapsed:8.3f}s  {nps:10.0f} nps", file=out)
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move generator leaf nodes (perft)")
+    parser.add_argument("--fen", help="position to search, runs the reference suite when left out")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="print the leaf count below every root move")
+    parser.add_argument("--board", action="store_true", help="run on the UI Board instead of the bitboard Position")
+    args = parser.parse_args(argv)
+
+    if args.fen is None:
+        return 0 if run_suite(args.depth, args.board) else 1
+
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(args.fen, args.depth, args.board)
+        for move in sorted(counts):
+            print(f"{move}: {counts[move]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = count(args.fen, args.depth, args.board)
+    elapsed = time.perf_counter() - start
+    nps = nodes / elapsed if elapsed > 0 else 0
+    print(f"nodes {nodes}  time {elapsed:.3f}s  {nps:.0f} nps")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
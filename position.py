@@ -0,0 +1,489 @@
+from const import *
+from square import Square
+from piece import *
+from move import Move
+from board import Board, KNIGHT_JUMPS, KING_STEPS, PROMOTIONS
+from evaluation import score_squares
+from zobrist import hash_board, hash_position, PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EN_PASSANT_KEYS
+
+# Bitboard position for search. Squares are numbered row * 8 + col, same as Board.squares,
+# so square 0 is a8 and square 63 is h1. One 64-bit int per piece type and color.
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_NAMES = ["pawn", "knight", "bishop", "rook", "queen", "king"]
+WHITE, BLACK = 0, 1
+COLOR_NAMES = ["white", "black"]
+
+# Castling rights bits
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+FEN_PIECES = "pnbrqk"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for row_incr, col_incr in offsets:
+            r, c = row + row_incr, col + col_incr
+            if 0 <= r < ROWS and 0 <= c < COLS:
+                bb |= 1 << (r * 8 + c)
+        table.append(bb)
+    return table
+
+
+def _ray(row_incr, col_incr):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        r, c = row + row_incr, col + col_incr
+        while 0 <= r < ROWS and 0 <= c < COLS:
+            bb |= 1 << (r * 8 + c)
+            r += row_incr
+            c += col_incr
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_JUMPS)
+KING_ATTACKS = _leaper_attacks(KING_STEPS)
+# Squares a pawn of each color attacks from a square, white pawns move up (row - 1)
+PAWN_ATTACKS = [_leaper_attacks([(-1, -1), (-1, 1)]), _leaper_attacks([(1, -1), (1, 1)])]
+
+# (ray table, increasing square index) per direction, the nearest blocker is the lowest / highest set bit
+DIAGONAL_RAYS = [(_ray(1, 1), True), (_ray(1, -1), True), (_ray(-1, 1), False), (_ray(-1, -1), False)]
+ORTHOGONAL_RAYS = [(_ray(1, 0), True), (_ray(0, 1), True), (_ray(-1, 0), False), (_ray(0, -1), False)]
+
+
+
+def _between():
+    # BETWEEN[a][b] is the squares strictly between a and b when they share a line, else 0
+    table = [[0] * 64 for sq in range(64)]
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        for row_incr, col_incr in KING_STEPS:
+            bb = 0
+            r, c = row + row_incr, col + col_incr
+            while 0 <= r < ROWS and 0 <= c < COLS:
+                table[sq][r * 8 + c] = bb
+                bb |= 1 << (r * 8 + c)
+                r += row_incr
+                c += col_incr
+    return table
+
+
+BETWEEN = _between()
+
+# Castling rights that survive a move touching a square (king or rook leaving / rook captured)
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[63] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASK[56] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASK[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[7] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASK[0] = 15 & ~BLACK_QUEENSIDE
+
+
+def slide_attacks(sq, occupied, rays):
+    attacks = 0
+    for ray, increasing in rays:
+        bb = ray[sq]
+        blockers = bb & occupied
+        if blockers:
+            if increasing:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            bb ^= ray[blocker]
+        attacks |= bb
+    return attacks
+
+
+def squares_of(bb):
+    "Yield the square index of every set bit"
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def square_name(sq):
+    row, col = divmod(sq, 8)
+    return f"{Square.get_alphacol(col)}{ROWS - row}"
+
+
+class Position:
+    # Moves are ints: from | to << 6 | promotion piece type << 12 (0 when not promoting)
+
+    __slots__ = ("pieces", "occupied", "side", "castling", "ep", "halfmove", "fullmove", "hash", "history")
+
+    def __init__(self, fen=START_FEN):
+        self.pieces = [0] * 12  # piece type + 6 for black, same order as ChessEncoder planes
+        self.occupied = [0, 0]
+        self.side = WHITE
+        self.castling = 0
+        self.ep = -1  # en passant target square, -1 for none
+        self.halfmove = 0
+        self.fullmove = 1
+        self.hash = 0  # Zobrist key, same keys as Board.hash
+        self.history = []
+        self.set_fen(fen)
+
+    @property
+    def turn(self):
+        return COLOR_NAMES[self.side]
+
+    # FEN
+
+    def set_fen(self, fen):
+        fields = fen.split()
+        self.pieces = [0] * 12
+        for row, rank in enumerate(fields[0].split("/")):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                color = WHITE if char.isupper() else BLACK
+                self.pieces[FEN_PIECES.index(char.lower()) + 6 * color] |= 1 << (row * 8 + col)
+                col += 1
+        self.occupied = [self._color_occupancy(WHITE), self._color_occupancy(BLACK)]
+        self.side = WHITE if len(fields) < 2 or fields[1] == "w" else BLACK
+        self.castling = 0
+        if len(fields) > 2:
+            for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+                if char in fields[2]:
+                    self.castling |= right
+        self.ep = -1
+        if len(fields) > 3 and fields[3] != "-":
+            col = ord(fields[3][0]) - ord("a")
+            row = ROWS - int(fields[3][1])
+            self.ep = row * 8 + col
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.hash = hash_position(self)
+        self.history = []
+
+    def fen(self):
+        ranks = []
+        for row in range(ROWS):
+            rank = ""
+            empty = 0
+            for col in range(COLS):
+                index = self.piece_at(row * 8 + col)
+                if index < 0:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                char = FEN_PIECES[index % 6]
+                rank += char.upper() if index < 6 else char
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = "".join(char for char, right in zip("KQkq", (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE))
+                           if self.castling & right) or "-"
+        ep = square_name(self.ep) if self.ep >= 0 else "-"
+        return f"{'/'.join(ranks)} {'w' if self.side == WHITE else 'b'} {castling} {ep} {self.halfmove} {self.fullmove}"
+
+    # Conversion to and from the UI board
+
+    @classmethod
+    def from_board(cls, board, turn="white"):
+        position = cls.__new__(cls)
+        position.pieces = [0] * 12
+        for row in range(ROWS):
+            for col in range(COLS):
+                piece = board.squares[row][col].piece
+                if piece is not None:
+                    color = WHITE if piece.color == "white" else BLACK
+                    position.pieces[PIECE_NAMES.index(piece.name) + 6 * color] |= 1 << (row * 8 + col)
+        position.occupied = [position._color_occupancy(WHITE), position._color_occupancy(BLACK)]
+        position.side = WHITE if turn == "white" else BLACK
+
+        # Castling rights come from the moved flags of kings and rooks still on their home squares
+        position.castling = board.castling_rights()
+
+        position.ep = -1
+        pawn = board.en_passant_pawn
+        if pawn is not None:
+            for row in range(ROWS):
+                for col in range(COLS):
+                    if board.squares[row][col].piece is pawn:
+                        position.ep = (row - pawn.dir) * 8 + col
+        position.halfmove = 0
+        position.fullmove = 1
+        position.hash = hash_position(position)
+        position.history = []
+        return position
+
+    def to_board(self):
+        board = Board()
+        for row in range(ROWS):
+            for col in range(COLS):
+                board.squares[row][col].piece = None
+        classes = {"pawn": Pawn, "king": King, **PROMOTIONS}
+        for index, bb in enumerate(self.pieces):
+            color = COLOR_NAMES[index // 6]
+            name = PIECE_NAMES[index % 6]
+            for sq in squares_of(bb):
+                row, col = divmod(sq, 8)
+                piece = classes[name](color)
+                # Only pieces that still matter for castling or double pushes keep moved == False
+                piece.moved = True
+                if name == "pawn":
+                    piece.moved = row != (6 if color == "white" else 1)
+                board.squares[row][col].piece = piece
+                if name == "king":
+                    board.king_squares[color] = (row, col)
+
+        for row, kingside, queenside in ((7, WHITE_KINGSIDE, WHITE_QUEENSIDE), (0, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            if self.castling & (kingside | queenside):
+                board.squares[row][4].piece.moved = False
+            if self.castling & kingside:
+                board.squares[row][7].piece.moved = False
+            if self.castling & queenside:
+                board.squares[row][0].piece.moved = False
+
+        if self.ep >= 0:
+            row, col = divmod(self.ep, 8)
+            pawn_row = row + 1 if self.side == WHITE else row - 1  # pawn that just moved belongs to the other side
+            board.set_true_en_passant(board.squares[pawn_row][col].piece)
+        board.hash = hash_board(board, self.turn)
+        board.eval_mg, board.eval_eg, board.phase = score_squares(board.squares)
+        board.piece_count = sum(bin(bb).count("1") for bb in self.pieces)
+        return board
+
+    @staticmethod
+    def from_board_move(move):
+        promotion = PIECE_NAMES.index(move.promotion) if move.promotion else 0
+        return (move.initial.row * 8 + move.initial.col) | (move.final.row * 8 + move.final.col) << 6 | promotion << 12
+
+    @staticmethod
+    def to_board_move(move, board):
+        "Board Move for a Position move, with the pieces filled in from the board"
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        initial = Square(frm // 8, frm % 8, board.squares[frm // 8][frm % 8].piece)
+        final = Square(to // 8, to % 8, board.squares[to // 8][to % 8].piece)
+        if promotion:
+            return Move(initial, final, PIECE_NAMES[promotion])
+        # Pawn moving diagonally onto an empty square with no promotion left to decide
+        if initial.piece is not None and initial.piece.name == "pawn" and final.piece is None and initial.col != final.col:
+            m = Move(initial, final)
+            m.en_passant_move = True
+            return m
+        return Move(initial, final)
+
+    @staticmethod
+    def move_name(move):
+        name = square_name(move & 63) + square_name((move >> 6) & 63)
+        if move >> 12:
+            name += FEN_PIECES[move >> 12]
+        return name
+
+    # Queries
+
+    def _color_occupancy(self, color):
+        bb = 0
+        for index in range(6 * color, 6 * color + 6):
+            bb |= self.pieces[index]
+        return bb
+
+    def piece_at(self, sq):
+        "Index into pieces of whatever stands on sq, -1 when empty"
+        bit = 1 << sq
+        if not (self.occupied[WHITE] | self.occupied[BLACK]) & bit:
+            return -1
+        for index, bb in enumerate(self.pieces):
+            if bb & bit:
+                return index
+        return -1
+
+    def is_square_attacked(self, sq, by):
+        pieces = self.pieces
+        base = 6 * by
+        if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT]:
+            return True
+        if PAWN_ATTACKS[by ^ 1][sq] & pieces[base + PAWN]:
+            return True
+        if KING_ATTACKS[sq] & pieces[base + KING]:
+            return True
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        queens = pieces[base + QUEEN]
+        if slide_attacks(sq, occupied, DIAGONAL_RAYS) & (pieces[base + BISHOP] | queens):
+            return True
+        if slide_attacks(sq, occupied, ORTHOGONAL_RAYS) & (pieces[base + ROOK] | queens):
+            return True
+        return False
+
+    def is_in_check(self, side=None):
+        side = self.side if side is None else side
+        king = self.pieces[6 * side + KING]
+        return self.is_square_attacked(king.bit_length() - 1, side ^ 1)
+
+    # Move generation
+
+    def pseudo_legal_moves(self):
+        us = self.side
+        them = us ^ 1
+        pieces = self.pieces
+        base = 6 * us
+        own = self.occupied[us]
+        enemy = self.occupied[them]
+        occupied = own | enemy
+        moves = []
+        add = moves.append
+
+        # Pawns
+        step = -8 if us == WHITE else 8
+        start_row = 6 if us == WHITE else 1
+        promotion_row = 0 if us == WHITE else 7
+        targets = enemy | (1 << self.ep if self.ep >= 0 else 0)
+        for frm in squares_of(pieces[base + PAWN]):
+            destinations = []
+            to = frm + step
+            if not occupied >> to & 1:
+                destinations.append(to)
+                if frm // 8 == start_row and not occupied >> (to + step) & 1:
+                    destinations.append(to + step)
+            destinations.extend(squares_of(PAWN_ATTACKS[us][frm] & targets))
+            for to in destinations:
+                if to // 8 == promotion_row:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        add(frm | to << 6 | promotion << 12)
+                else:
+                    add(frm | to << 6)
+
+        for frm in squares_of(pieces[base + KNIGHT]):
+            for to in squares_of(KNIGHT_ATTACKS[frm] & ~own):
+                add(frm | to << 6)
+        for frm in squares_of(pieces[base + BISHOP] | pieces[base + QUEEN]):
+            for to in squares_of(slide_attacks(frm, occupied, DIAGONAL_RAYS) & ~own):
+                add(frm | to << 6)
+        for frm in squares_of(pieces[base + ROOK] | pieces[base + QUEEN]):
+            for to in squares_of(slide_attacks(frm, occupied, ORTHOGONAL_RAYS) & ~own):
+                add(frm | to << 6)
+
+        king = pieces[base + KING].bit_length() - 1
+        for to in squares_of(KING_ATTACKS[king] & ~own):
+            add(king | to << 6)
+
+        # Castling, the king may not start, pass or land on an attacked square
+        if us == WHITE:
+            rights = ((WHITE_KINGSIDE, 60, 62, (61, 62), (60, 61, 62)), (WHITE_QUEENSIDE, 60, 58, (57, 58, 59), (60, 59, 58)))
+        else:
+            rights = ((BLACK_KINGSIDE, 4, 6, (5, 6), (4, 5, 6)), (BLACK_QUEENSIDE, 4, 2, (1, 2, 3), (4, 3, 2)))
+        for right, frm, to, between, path in rights:
+            if self.castling & right and not any(occupied >> sq & 1 for sq in between) and \
+                    not any(self.is_square_attacked(sq, them) for sq in path):
+                add(frm | to << 6)
+
+        return moves
+
+    def pinned(self):
+        "Bitboard of our pieces pinned to our king"
+        us = self.side
+        them = us ^ 1
+        pieces = self.pieces
+        king = pieces[6 * us + KING].bit_length() - 1
+        enemy = self.occupied[them]
+        queens = pieces[6 * them + QUEEN]
+        # Rays from the king that see through our own pieces and stop at enemy sliders
+        snipers = slide_attacks(king, enemy, DIAGONAL_RAYS) & (pieces[6 * them + BISHOP] | queens)
+        snipers |= slide_attacks(king, enemy, ORTHOGONAL_RAYS) & (pieces[6 * them + ROOK] | queens)
+        occupied = self.occupied[us] | enemy
+        pinned = 0
+        for sniper in squares_of(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers & self.occupied[us]
+        return pinned
+
+    def legal_moves(self):
+        us = self.side
+        pieces = self.pieces
+        king = pieces[6 * us + KING].bit_length() - 1
+        pawns = pieces[6 * us + PAWN]
+        in_check = self.is_in_check(us)
+        pinned = self.pinned()
+        moves = []
+        for move in self.pseudo_legal_moves():
+            frm = move & 63
+            # Only king moves, pinned pieces, en passant and check evasions can leave the king attacked
+            if in_check or frm == king or pinned >> frm & 1 or ((move >> 6) & 63 == self.ep and pawns >> frm & 1):
+                self.make_move(move)
+                if not self.is_in_check(us):
+                    moves.append(move)
+                self.unmake_move()
+            else:
+                moves.append(move)
+        return moves
+
+    # Make / unmake
+
+    def make_move(self, move):
+        pieces = self.pieces
+        occupied = self.occupied
+        self.history.append((pieces[:], occupied[:], self.castling, self.ep, self.halfmove, self.fullmove, self.hash))
+
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        us = self.side
+        them = us ^ 1
+        base = 6 * us
+        from_bit = 1 << frm
+        to_bit = 1 << to
+
+        moving = base
+        while not pieces[moving] & from_bit:
+            moving += 1
+        piece_type = moving - base
+        h = self.hash ^ SIDE_KEY ^ CASTLING_KEYS[self.castling]
+        if self.ep >= 0:
+            h ^= EN_PASSANT_KEYS[self.ep % 8]
+
+        self.halfmove += 1
+        if occupied[them] & to_bit:
+            captured = 6 * them
+            while not pieces[captured] & to_bit:
+                captured += 1
+            pieces[captured] ^= to_bit
+            occupied[them] ^= to_bit
+            h ^= PIECE_KEYS[captured][to]
+            self.halfmove = 0
+
+        landing = base + promotion if promotion else moving
+        pieces[moving] ^= from_bit
+        occupied[us] ^= from_bit | to_bit
+        pieces[landing] |= to_bit
+        h ^= PIECE_KEYS[moving][frm] ^ PIECE_KEYS[landing][to]
+
+        if piece_type == PAWN:
+            self.halfmove = 0
+            if to == self.ep:
+                captured_sq = to + 8 if us == WHITE else to - 8
+                pieces[6 * them + PAWN] ^= 1 << captured_sq
+                occupied[them] ^= 1 << captured_sq
+                h ^= PIECE_KEYS[6 * them + PAWN][captured_sq]
+        elif piece_type == KING and abs(to - frm) == 2:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            rook_bits = 1 << rook_from | 1 << rook_to
+            pieces[base + ROOK] ^= rook_bits
+            occupied[us] ^= rook_bits
+            h ^= PIECE_KEYS[base + ROOK][rook_from] ^ PIECE_KEYS[base + ROOK][rook_to]
+
+        self.ep = (frm + to) // 2 if piece_type == PAWN and abs(to - frm) == 16 else -1
+        self.castling &= CASTLING_MASK[frm] & CASTLING_MASK[to]
+        if self.ep >= 0:
+            h ^= EN_PASSANT_KEYS[self.ep % 8]
+        self.hash = h ^ CASTLING_KEYS[self.castling]
+        if us == BLACK:
+            self.fullmove += 1
+        self.side = them
+
+    def unmake_move(self):
+        self.pieces, self.occupied, self.castling, self.ep, self.halfmove, self.fullmove, self.hash = self.history.pop()
+        self.side ^= 1
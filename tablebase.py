@@ -0,0 +1,231 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Endgame tables for king + one piece against a lone king (KQK, KRK, KPK), built by retrograde
+# analysis. The side with the piece is called strong and played as white during the build
+# (squares row * 8 + col like Board, white pawns move towards row 0), a position with black as
+# the strong side is flipped vertically before probing.
+#
+# A table is 2 * 64 * 64 * 64 int8 values, indexed by side to move (0 strong, 1 weak), strong king,
+# weak king and piece square. Value n > 0: the side to move mates in n plies, n < 0: it is mated in
+# -n - 1 plies (-1 is checkmate on the board), 0: draw (or an impossible placement).
+
+SIGNATURES = {"kqk": "queen", "krk": "rook", "kpk": "pawn"}
+DEFAULT_TABLE_DIR = "./ai_models/endgames"
+TABLE_SIZE = 64 * 64 * 64
+
+KING_DIRECTIONS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+PIECE_DIRECTIONS = {
+    "queen": KING_DIRECTIONS,
+    "rook": [(-1, 0), (0, -1), (0, 1), (1, 0)],
+}
+WIN = 1000  # while building, a win in n plies scores WIN - n and a loss in n plies -(WIN - n)
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _ray_tables(directions):
+    # ray_square[sq, d, k]: square k + 1 steps from sq along direction d (-1 off the board),
+    # ray_step[sq, d, other]: how many steps other is from sq along d (0 when not on the ray)
+    ray_square = np.full((64, len(directions), 7), -1, dtype=np.int64)
+    ray_step = np.zeros((64, len(directions), 64), dtype=np.int64)
+    for sq in range(64):
+        for d, (dr, dc) in enumerate(directions):
+            row, col = divmod(sq, 8)
+            for k in range(7):
+                row, col = row + dr, col + dc
+                if not _on_board(row, col):
+                    break
+                ray_square[sq, d, k] = row * 8 + col
+                ray_step[sq, d, row * 8 + col] = k + 1
+    return ray_square, ray_step
+
+
+def _king_tables():
+    king_square = np.full((64, 8), -1, dtype=np.int64)
+    adjacent = np.zeros((64, 64), dtype=bool)
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        for i, (dr, dc) in enumerate(KING_DIRECTIONS):
+            if _on_board(row + dr, col + dc):
+                king_square[sq, i] = (row + dr) * 8 + col + dc
+                adjacent[sq, (row + dr) * 8 + col + dc] = True
+    return king_square, adjacent
+
+
+def _attacks(piece, x, target, blocker):
+    "Does the piece on x attack target, with blocker (the strong king) possibly in between"
+    if piece == "pawn":
+        return (target == x - 9) & (x % 8 != 0) | (target == x - 7) & (x % 8 != 7)
+    ray_square, ray_step = _ray_tables(PIECE_DIRECTIONS[piece])
+    attacked = np.zeros(len(x), dtype=bool)
+    for d in range(ray_step.shape[1]):
+        distance = ray_step[x, d, target]
+        between = ray_step[x, d, blocker]
+        attacked |= (distance > 0) & ~((between > 0) & (between < distance))
+    return attacked
+
+
+def build_table(piece, promotions=None):
+    "(2, 64 * 64 * 64) int8 table for king + piece against king, promotions maps a promoted piece to its table"
+    sk, wk, x = (a.ravel() for a in np.indices((64, 64, 64)))
+    king_square, adjacent = _king_tables()
+
+    valid = (sk != wk) & (x != sk) & (x != wk) & ~adjacent[sk, wk]
+    if piece == "pawn":
+        valid &= (x // 8 != 0) & (x // 8 != 7)
+    weak_in_check = valid & _attacks(piece, x, wk, sk)
+    # With the strong side to move the weak king can't be in check, the strong king never can
+    legal = np.stack([valid & ~weak_in_check, valid])
+
+    def index(strong_king, weak_king, square):
+        return (strong_king * 64 + weak_king) * 64 + square
+
+    # Moves of each side as (successor index or None, fixed successor scores when None, allowed)
+    moves = [[], []]
+    for i in range(8):
+        # Strong king steps, not next to the weak king or onto the piece
+        target = king_square[sk, i]
+        ok = (target >= 0) & (target != x) & ~adjacent[np.maximum(target, 0), wk]
+        moves[0].append((index(np.maximum(target, 0), wk, x), None, ok))
+        # Weak king steps, capturing the piece leaves a drawn king against king
+        target = king_square[wk, i]
+        ok = (target >= 0) & ~adjacent[np.maximum(target, 0), sk]
+        capture = ok & (target == x)
+        moves[1].append((index(sk, np.maximum(target, 0), x), None, ok & ~capture))
+        moves[1].append((None, np.zeros(len(x), dtype=np.int64), capture))
+
+    if piece == "pawn":
+        push = x - 8
+        free = (push >= 0) & (push != sk) & (push != wk)
+        promoting = free & (push // 8 == 0)
+        moves[0].append((index(sk, wk, np.maximum(push, 0)), None, free & ~promoting))
+        double = x - 16
+        moves[0].append((index(sk, wk, np.maximum(double, 0)), None,
+                         free & (x // 8 == 6) & (double != sk) & (double != wk)))
+        for promoted in (promotions or {}).values():
+            # Promoted piece table with the weak side to move
+            moves[0].append((None, _scores(promoted[1][index(sk, wk, np.maximum(push, 0))]), promoting))
+    else:
+        ray_square, ray_step = _ray_tables(PIECE_DIRECTIONS[piece])
+        for d in range(ray_square.shape[1]):
+            strong_step, weak_step = ray_step[x, d, sk], ray_step[x, d, wk]
+            for k in range(7):
+                target = ray_square[x, d, k]
+                # Stops before either king, kings are never captured
+                ok = (target >= 0) & ~((strong_step > 0) & (strong_step <= k + 1)) & ~((weak_step > 0) & (weak_step <= k + 1))
+                moves[0].append((index(sk, wk, np.maximum(target, 0)), None, ok))
+
+    # Only moves to legal positions count, then positions without moves are mate or stalemate
+    for side in (0, 1):
+        moves[side] = [(successor, fixed, ok & legal[side] & (legal[1 - side][successor] if successor is not None else True))
+                       for successor, fixed, ok in moves[side]]
+    values = np.zeros((2, TABLE_SIZE), dtype=np.int64)
+    for side in (0, 1):
+        has_move = np.zeros(TABLE_SIZE, dtype=bool)
+        for successor, fixed, ok in moves[side]:
+            has_move |= ok
+        in_check = weak_in_check if side == 1 else np.zeros(TABLE_SIZE, dtype=bool)
+        values[side][legal[side] & ~has_move & in_check] = -WIN
+
+    # Retrograde by repeated backing up: a win comes from the quickest losing successor, a loss
+    # (all successors won for the opponent) from the slowest one, unknown counts as a draw
+    while True:
+        changed = False
+        for side in (0, 1):
+            best = np.full(TABLE_SIZE, -2 * WIN, dtype=np.int64)
+            for successor, fixed, ok in moves[side]:
+                score = values[1 - side][successor] if successor is not None else fixed
+                score = -score + np.sign(score)
+                best = np.where(ok, np.maximum(best, score), best)
+            terminal = best == -2 * WIN
+            new = np.where(terminal | ~legal[side], values[side], best)
+            if not np.array_equal(new, values[side]):
+                values[side] = new
+                changed = True
+        if not changed:
+            break
+
+    # WIN - n becomes n, -(WIN - n) becomes -n - 1
+    table = np.where(values > 0, WIN - values, np.where(values < 0, -(WIN + values) - 1, 0))
+    return table.astype(np.int8)
+
+
+def _scores(table):
+    # Table values back to the build scores
+    table = table.astype(np.int64)
+    return np.where(table > 0, WIN - table, np.where(table < 0, -(WIN + table + 1), 0))
+
+
+def build_all(directory=DEFAULT_TABLE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    tables = {}
+    for name in ("kqk", "krk", "kpk"):
+        start = time.perf_counter()
+        promotions = {"queen": tables["kqk"], "rook": tables["krk"]} if name == "kpk" else None
+        tables[name] = build_table(SIGNATURES[name], promotions)
+        tables[name].tofile(os.path.join(directory, f"{name}.bin"))
+        wins = int((tables[name][0] > 0).sum())
+        longest = int(tables[name][0].max())
+        print(f"{name}: {wins} wins with the strong side to move, longest {longest} plies, "
+              f"{time.perf_counter() - start:.1f}s")
+    return tables
+
+
+class EndgameTables:
+    # Loaded tables, probed with a Board that has exactly three pieces on it
+
+    def __init__(self, directory=DEFAULT_TABLE_DIR):
+        self.tables = {}
+        for name, piece in SIGNATURES.items():
+            path = os.path.join(directory, f"{name}.bin")
+            if os.path.exists(path):
+                self.tables[piece] = np.fromfile(path, dtype=np.int8).reshape(2, TABLE_SIZE)
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def probe(self, board, color):
+        "Table value (see above) for color to move, None when the position isn't in a table"
+        kings = {}
+        strong = None
+        for row in range(8):
+            for col in range(8):
+                piece = board.squares[row][col].piece
+                if piece is None:
+                    continue
+                if piece.name == "king":
+                    kings[piece.color] = row * 8 + col
+                elif strong is None:
+                    strong = (piece, row * 8 + col)
+                else:
+                    return None
+        if strong is None or strong[0].name not in self.tables or len(kings) != 2:
+            return None
+
+        piece, square = strong
+        strong_king = kings[piece.color]
+        weak_king = kings["black" if piece.color == "white" else "white"]
+        if piece.color == "black":
+            # Flip the board so the strong side plays up the board like white
+            square, strong_king, weak_king = square ^ 56, strong_king ^ 56, weak_king ^ 56
+        side = 0 if color == piece.color else 1
+        return int(self.tables[piece.name][side, (strong_king * 64 + weak_king) * 64 + square])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the KQK, KRK and KPK endgame tables")
+    parser.add_argument("--dir", default=DEFAULT_TABLE_DIR)
+    args = parser.parse_args(argv)
+    build_all(args.dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
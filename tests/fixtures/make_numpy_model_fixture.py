@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+# Writes the fixture tests/test_numpy_model.py checks NumpyModel against: a small randomly
+# initialised model with the layers of ModelBuilder.create_chess_model, exported to .npz
+# (float32 and int8), and the Keras outputs for a few encoded positions. Needs TensorFlow,
+# the test itself doesn't. Run from the repository root: python tests/fixtures/make_numpy_model_fixture.py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+
+from numpy_model import export_model, sample_inputs
+
+
+def build_model():
+    import tensorflow as tf
+    from tensorflow.keras import layers, models
+
+    tf.keras.utils.set_random_seed(0)
+    model = models.Sequential([
+        layers.Input((8, 8, 12)),
+        layers.Conv2D(8, (3, 3), activation='relu', padding='same'),
+        layers.BatchNormalization(),
+        layers.Conv2D(8, (3, 3), activation='relu', padding='same'),
+        layers.BatchNormalization(),
+        layers.Flatten(),
+        layers.Dense(16, activation='relu'),
+        layers.Dropout(0.3),
+        layers.Dense(1, activation='tanh'),
+    ])
+    # Untrained batch norm is the identity, give it statistics so the folding is tested
+    rng = np.random.default_rng(0)
+    for layer in model.layers:
+        if isinstance(layer, layers.BatchNormalization):
+            channels = layer.get_weights()[0].shape
+            layer.set_weights([rng.uniform(0.5, 1.5, channels), rng.normal(0, 0.1, channels),
+                               rng.normal(0, 0.2, channels), rng.uniform(0.5, 2, channels)])
+    return model
+
+
+def main():
+    model = build_model()
+    inputs = sample_inputs(16, seed=1)
+    export_model(model, os.path.join(HERE, "small_model.npz"))
+    export_model(model, os.path.join(HERE, "small_model_int8.npz"), int8=True)
+    outputs = np.asarray(model.predict(inputs, verbose=0))
+    np.savez(os.path.join(HERE, "small_model_outputs.npz"), inputs=inputs, outputs=outputs)
+    print(f"Wrote the fixture for {len(inputs)} positions to {HERE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+
+from ai import AIPlayer
+from book import OpeningBook, build
+from position import Position
+
+GAMES = """[Event "1"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 1-0
+
+[Event "2"]
+
+1. e4 c5 2. Nf3 {a comment} d6 (2... Nc6 3. d4) 3. d4 cxd4 0-1
+
+[Event "3"]
+
+1. d4 d5 2. c4 e6 3. Nc3 Nf6 1/2-1/2
+"""
+
+
+def write_pgn(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(GAMES)
+    return str(path)
+
+
+def test_build_counts_moves(tmp_path):
+    out = str(tmp_path / "book.bin")
+    assert build([write_pgn(tmp_path)], out, min_count=1) > 0
+    book = OpeningBook(out)
+    moves = {Position.move_name(move): count for move, count in book.moves(Position().hash)}
+    assert moves == {"e2e4": 2, "d2d4": 1}
+    assert np.all(book.keys[1:] >= book.keys[:-1])
+
+
+def test_chunked_build_matches_one_chunk(tmp_path):
+    pgn = write_pgn(tmp_path)
+    build([pgn], str(tmp_path / "one.bin"), min_count=1)
+    build([pgn], str(tmp_path / "chunked.bin"), min_count=1, chunk_games=1)
+    assert (tmp_path / "one.bin").read_bytes() == (tmp_path / "chunked.bin").read_bytes()
+
+
+def test_min_count_is_applied_to_the_merged_counts(tmp_path):
+    out = str(tmp_path / "book.bin")
+    build([write_pgn(tmp_path)], out, min_count=2, chunk_games=1)
+    book = OpeningBook(out)
+    assert [Position.move_name(move) for move, count in book.moves(Position().hash)] == ["e2e4"]
+
+
+def test_build_creates_the_output_directory(tmp_path):
+    out = tmp_path / "ai_models" / "books" / "book.bin"
+    assert build([write_pgn(tmp_path)], str(out), min_count=1) > 0
+    assert len(OpeningBook(str(out))) > 0
+
+
+def test_book_without_moves_is_not_written(tmp_path):
+    out = tmp_path / "book.bin"
+    assert build([write_pgn(tmp_path)], str(out), min_count=5) == 0
+    assert not out.exists()
+
+
+def test_empty_book_file_is_no_book(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    book = OpeningBook(str(path))
+    assert len(book) == 0
+    assert book.choose(Position().hash) is None
+
+    player = AIPlayer(depth=1, use_nn=False, book_path=str(path), endgame_dir=None)
+    assert player.book_move(Position().to_board(), "white") is None
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+
+from numpy_model import NumpyModel
+
+# Fixture written by fixtures/make_numpy_model_fixture.py with TensorFlow installed
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_outputs():
+    with np.load(os.path.join(FIXTURES, "small_model_outputs.npz")) as data:
+        return data["inputs"], data["outputs"]
+
+
+def test_float32_export_matches_keras():
+    inputs, expected = load_outputs()
+    model = NumpyModel.load(os.path.join(FIXTURES, "small_model.npz"))
+    np.testing.assert_allclose(model.predict_on_batch(inputs), expected, atol=1e-5)
+
+
+def test_int8_export_is_close_to_keras():
+    inputs, expected = load_outputs()
+    model = NumpyModel.load(os.path.join(FIXTURES, "small_model_int8.npz"))
+    np.testing.assert_allclose(model.predict_on_batch(inputs), expected, atol=0.05)
+
+
+def test_outputs_vary_with_the_position():
+    # Guards against a fixture that would pass whatever the backend computes
+    inputs, expected = load_outputs()
+    assert np.ptp(expected) > 0.01
@@ -0,0 +1,73 @@
+from array import array
+
+# Bound types, what the stored score means relative to the true score
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    # Fixed size table of search results keyed by Zobrist hash.
+    # Entries live in flat typed arrays (no per-entry objects), two per bucket:
+    # slot 0 keeps the deepest result of the current search, slot 1 is always replaced.
+
+    ENTRY_SIZE = 8 + 8 + 2 + 1 + 1 + 1  # key, score, move, depth, bound, age in bytes
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.buckets = max(1, int(size_mb * 1024 * 1024) // (self.ENTRY_SIZE * 2))
+        entries = self.buckets * 2
+        self.keys = array("Q", [0]) * entries
+        self.scores = array("d", [0.0]) * entries
+        self.moves = array("H", [0]) * entries  # Position style move int, 0 for none
+        self.depths = array("b", [-1]) * entries  # -1 marks an empty slot
+        self.bounds = array("B", [EXACT]) * entries
+        self.ages = array("B", [0]) * entries
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.used = 0
+
+    def new_search(self):
+        # Entries from older searches lose their claim on the depth-preferred slot
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.__init__(self.size_mb)
+
+    def probe(self, key):
+        "(depth, score, bound, move) stored for key, or None"
+        self.probes += 1
+        index = (key % self.buckets) * 2
+        for slot in (index, index + 1):
+            if self.keys[slot] == key and self.depths[slot] >= 0:
+                self.hits += 1
+                return self.depths[slot], self.scores[slot], self.bounds[slot], self.moves[slot]
+        return None
+
+    def store(self, key, depth, score, bound, move=0):
+        self.stores += 1
+        slot = (key % self.buckets) * 2
+        depths = self.depths
+        # Depth-preferred slot unless it holds something deeper from this search
+        if not (depths[slot] < 0 or self.keys[slot] == key or depth >= depths[slot] or self.ages[slot] != self.age):
+            slot += 1
+        if depths[slot] < 0:
+            self.used += 1
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.depths[slot] = min(depth, 127)
+        self.bounds[slot] = bound
+        self.ages[slot] = self.age
+
+    def stats(self):
+        entries = self.buckets * 2
+        return {
+            "size_mb": self.size_mb,
+            "entries": entries,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+            "stores": self.stores,
+            "fill": self.used / entries,
+        }
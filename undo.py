@@ -0,0 +1,20 @@
+class Undo:
+    # Everything Board.unmake_move needs to put the board back exactly as it was
+
+    def __init__(self,piece,move):
+        self.piece = piece #None for a null move (side to move passes)
+        self.move = move
+        self.moved = piece.moved if piece else False #moved flag of the piece before the move
+        self.captured = None
+        self.captured_row = move.final.row if move else None #differs from final square for en passant
+        self.captured_col = move.final.col if move else None
+        self.promoted = None #piece that replaced the pawn on promotion
+        self.rook = None #castling rook
+        self.rook_from = None
+        self.rook_to = None
+        self.rook_moved = False
+        self.en_passant_pawn = None #pawn that could be taken en passant before the move
+        self.en_passant_col = None
+        self.last_move = None
+        self.hash = 0 #Zobrist key before the move
+        self.scores = None #Board eval_mg, eval_eg, phase and piece_count before the move
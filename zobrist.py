@@ -0,0 +1,51 @@
+import random
+from const import *
+
+# Zobrist keys shared by Board and Position so both give the same hash for the same position.
+# Fixed seed, hashes are stored in files (opening book) and must not change between runs.
+_random = random.Random(20240601)
+
+PIECE_INDEX = {"pawn": 0, "knight": 1, "bishop": 2, "rook": 3, "queen": 4, "king": 5}
+
+# PIECE_KEYS[piece type + 6 for black][row * 8 + col]
+PIECE_KEYS = [[_random.getrandbits(64) for sq in range(64)] for index in range(12)]
+SIDE_KEY = _random.getrandbits(64)  # xored in when black is to move
+CASTLING_KEYS = [_random.getrandbits(64) for rights in range(16)]  # indexed by the castling rights bits
+EN_PASSANT_KEYS = [_random.getrandbits(64) for col in range(COLS)]  # file of the en passant square
+
+
+def piece_key(piece, row, col):
+    return PIECE_KEYS[PIECE_INDEX[piece.name] + (0 if piece.color == "white" else 6)][row * 8 + col]
+
+
+def hash_board(board, turn="white"):
+    "Full hash of a Board, make_move / unmake_move keep board.hash equal to this"
+    h = 0
+    for row in range(ROWS):
+        for col in range(COLS):
+            piece = board.squares[row][col].piece
+            if piece is not None:
+                h ^= piece_key(piece, row, col)
+    if turn == "black":
+        h ^= SIDE_KEY
+    h ^= CASTLING_KEYS[board.castling_rights()]
+    if board.en_passant_pawn is not None:
+        h ^= EN_PASSANT_KEYS[board.en_passant_col]
+    return h
+
+
+def hash_position(position):
+    "Full hash of a Position, make_move keeps position.hash equal to this"
+    h = 0
+    for index, bb in enumerate(position.pieces):
+        keys = PIECE_KEYS[index]
+        while bb:
+            low = bb & -bb
+            h ^= keys[low.bit_length() - 1]
+            bb ^= low
+    if position.side:
+        h ^= SIDE_KEY
+    h ^= CASTLING_KEYS[position.castling]
+    if position.ep >= 0:
+        h ^= EN_PASSANT_KEYS[position.ep % 8]
+    return h